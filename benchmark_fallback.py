@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the offline flashcard generator's notes analysis
+Times analyze_notes on synthetic notes of growing size to check it scales linearly
+"""
+import random
+import sys
+import time
+
+from text_analysis import analyze_notes
+
+SUBJECT_WORDS = [
+    'photosynthesis', 'chlorophyll', 'mitochondria', 'enzyme', 'glucose', 'membrane',
+    'osmosis', 'diffusion', 'ribosome', 'nucleus', 'Krebs', 'Calvin', 'ATP', 'NADPH',
+    'catalyst', 'substrate', 'allele', 'genotype', 'phenotype', 'Mendel', 'meiosis',
+]
+FILLER_WORDS = [
+    'the', 'process', 'is', 'a', 'system', 'in', 'which', 'energy', 'cells', 'use',
+    'and', 'of', 'to', 'plants', 'important', 'during', 'light', 'reaction', 'form',
+]
+
+
+def make_notes(size_bytes, seed=42):
+    """Build pseudo-random study notes of roughly size_bytes"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size_bytes:
+        words = [rng.choice(SUBJECT_WORDS if rng.random() < 0.25 else FILLER_WORDS)
+                 for _ in range(rng.randint(6, 18))]
+        sentence = ' '.join(words).capitalize() + '. '
+        parts.append(sentence)
+        total += len(sentence)
+    return ''.join(parts)
+
+
+def time_analysis(notes, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        analyze_notes(notes, max_terms=21, max_sentences=20)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    sizes_mb = [int(arg) for arg in sys.argv[1:]] or [1, 2, 4, 8]
+    print("📊 Benchmarking fallback notes analysis...")
+    print("=" * 50)
+
+    baseline = None
+    for size_mb in sizes_mb:
+        notes = make_notes(size_mb * 1024 * 1024)
+        elapsed = time_analysis(notes)
+        per_mb = elapsed / size_mb
+        baseline = baseline or per_mb
+        print(f"{size_mb:>4} MB: {elapsed:7.3f}s  ({per_mb:.3f}s/MB, {per_mb / baseline:.2f}x the first size)")
+
+    print("=" * 50)
+    print("Roughly constant s/MB across sizes means the analysis scales linearly")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Database connection pool for EduVerse
+"""
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class PooledConnection:
+    """Connection proxy whose close() hands the connection back to the pool"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.on_query is not None:
+            return TimedCursor(cursor, self._pool.on_query)
+        return cursor
+
+    def commit(self):
+        return self._raw.commit()
+
+    def rollback(self):
+        return self._raw.rollback()
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if not self._released:
+            self._released = True
+            self._pool.putconn(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # A caller that raised before close() must not leak its pool slot; the
+        # connection state is unknown at that point, so drop it instead of reusing it
+        if not getattr(self, '_released', True):
+            self._released = True
+            try:
+                self._pool.discard(self._raw)
+            except Exception:
+                pass
+
+
+class TimedCursor:
+    """Cursor proxy that reports every statement to on_query(statement, params, seconds, many=False)"""
+
+    def __init__(self, cursor, on_query):
+        self._cursor = cursor
+        self._on_query = on_query
+
+    def execute(self, query, params=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params)
+        finally:
+            self._on_query(query, params, time.perf_counter() - start)
+
+    def executemany(self, query, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_of_params)
+        finally:
+            self._on_query(query, seq_of_params, time.perf_counter() - start, many=True)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections shared by EduVerse"""
+
+    def __init__(self, connect, min_size=1, max_size=10, max_idle=300,
+                 timeout=30, health_check_interval=30, on_query=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (min_size, max_size))
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.on_query = on_query  # if set, cursors are wrapped in TimedCursor
+
+        self._idle = deque()  # (raw_connection, last_used) pairs, most recent on the right
+        self._size = 0  # open connections, idle and checked out
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._pid = os.getpid()
+
+    def stats(self):
+        """Return current pool occupancy"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+    def warm(self):
+        """Open connections until min_size are available"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._connect()
+            except Exception:
+                self._release_slot()
+                raise
+            self.putconn(raw)
+
+    def getconn(self):
+        """Check out a healthy connection, opening a new one if the pool has room"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            raw, last_used = self._acquire(deadline)
+            if raw is None:
+                # A slot was reserved for us; open the connection outside the lock
+                try:
+                    raw = self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                return PooledConnection(self, raw)
+
+            if self._is_healthy(raw, last_used):
+                return PooledConnection(self, raw)
+            self.discard(raw)
+
+    def putconn(self, raw):
+        """Return a connection to the pool after resetting its transaction state"""
+        if os.getpid() != self._pid:
+            # Inherited across a fork: the socket belongs to the parent, so never close it here
+            return
+        if self._closed or not self._reset(raw):
+            self.discard(raw)
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, raw):
+        """Close a connection and free its slot"""
+        self._close_quietly(raw)
+        self._release_slot()
+
+    def closeall(self):
+        """Close every idle connection and refuse to pool returned ones"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    def _acquire(self, deadline):
+        expired = []
+        try:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    expired.extend(self._evict_idle())
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.max_size:
+                        self._size += 1
+                        return None, None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            "No database connection available after %ss" % self.timeout)
+                    self._cond.wait(remaining)
+        finally:
+            for raw in expired:
+                self._close_quietly(raw)
+
+    def _evict_idle(self):
+        """Pop connections idle longer than max_idle, keeping min_size open (lock held)"""
+        expired = []
+        if not self.max_idle:
+            return expired
+        cutoff = time.monotonic() - self.max_idle
+        # Oldest connections sit on the left
+        while self._idle and self._idle[0][1] < cutoff and self._size > self.min_size:
+            raw, _ = self._idle.popleft()
+            self._size -= 1
+            expired.append(raw)
+        return expired
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, raw, last_used):
+        """Cheap liveness check, plus a server round trip for long-idle connections"""
+        if getattr(raw, 'closed', 0) or getattr(raw, 'open', True) is False:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            if hasattr(raw, 'ping'):
+                raw.ping(reconnect=False)  # PyMySQL
+            else:
+                cursor = raw.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+                raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(raw):
+        """Roll back any open transaction; return False if the connection is unusable"""
+        try:
+            if getattr(raw, 'closed', 0) or getattr(raw, 'open', True) is False:
+                return False
+            get_status = getattr(raw, 'get_transaction_status', None)
+            if get_status is not None:
+                # psycopg2: 0 idle, 1 active, 2 in transaction, 3 in error, 4 unknown
+                status = get_status()
+                if status == 4:
+                    return False
+                if status != 0:
+                    raw.rollback()
+                return True
+            get_autocommit = getattr(raw, 'get_autocommit', None)
+            if get_autocommit is not None and not get_autocommit():
+                raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
@@ -0,0 +1,148 @@
+"""
+Content-addressed cache for AI-generated flashcards
+
+Entries live in a SQLite file so they survive restarts and are shared by
+every worker process on the host. The cache is bounded by entry count
+(least recently used entries are evicted first) and each entry expires
+after a TTL.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_notes(notes):
+    """Normalize notes so trivially different pastes share a cache entry"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFKC', notes)).strip()
+
+
+def flashcard_cache_key(notes, num_cards, prompt_version):
+    """Hash of normalized notes, card count and prompt version"""
+    payload = f"v{prompt_version}\x00{num_cards}\x00{normalize_notes(notes)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FlashcardCache:
+    """Bounded LRU + TTL cache of generated cards, persisted in SQLite"""
+
+    def __init__(self, path, max_entries=5000, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        self._puts = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS flashcard_cache (
+                cache_key TEXT PRIMARY KEY,
+                cards TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_flashcard_cache_last_used ON flashcard_cache (last_used_at)")
+
+    def get(self, key):
+        """Return cached cards for key, or None on a miss or expired entry"""
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT cards, created_at FROM flashcard_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._count(hit=False)
+                return None
+            if self.ttl and row[1] < now - self.ttl:
+                connection.execute("DELETE FROM flashcard_cache WHERE cache_key = ?", (key,))
+                self._count(hit=False)
+                return None
+            connection.execute(
+                "UPDATE flashcard_cache SET last_used_at = ? WHERE cache_key = ?", (now, key))
+            self._count(hit=True)
+            return json.loads(row[0])
+        except Exception as e:
+            logger.warning("Flashcard cache read failed: %s", e)
+            self._count(hit=False)
+            return None
+
+    def put(self, key, cards):
+        """Store cards under key, evicting least recently used entries past max_entries"""
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute("""
+                INSERT OR REPLACE INTO flashcard_cache (cache_key, cards, created_at, last_used_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, json.dumps(cards), now, now))
+            with self._counter_lock:
+                self._puts += 1
+                # Trimming needs a COUNT, so only do it every few writes
+                should_trim = self._puts % 20 == 1
+            if should_trim:
+                self._evict(connection, now)
+        except Exception as e:
+            logger.warning("Flashcard cache write failed: %s", e)
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current entry count"""
+        try:
+            entries = self._connection().execute("SELECT COUNT(*) FROM flashcard_cache").fetchone()[0]
+        except Exception:
+            entries = None
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+            }
+
+    def _evict(self, connection, now):
+        if self.ttl:
+            connection.execute("DELETE FROM flashcard_cache WHERE created_at < ?", (now - self.ttl,))
+        excess = connection.execute("SELECT COUNT(*) FROM flashcard_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            connection.execute("""
+                DELETE FROM flashcard_cache WHERE cache_key IN (
+                    SELECT cache_key FROM flashcard_cache ORDER BY last_used_at LIMIT ?
+                )
+            """, (excess,))
+
+    def _count(self, hit):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _connection(self):
+        """One autocommit SQLite connection per thread (and per process after a fork)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
@@ -0,0 +1,97 @@
+"""
+Gunicorn configuration for EduVerse
+
+Worker and thread counts come from the CPU count unless overridden with
+WEB_CONCURRENCY / GUNICORN_THREADS, and the worker count is capped so that
+every worker's database pool fits DB_CONNECTION_BUDGET. The app is
+preloaded once in the master, and each worker builds its own database
+pool after the fork.
+Workers are recycled after a jittered number of requests.
+"""
+import multiprocessing
+import os
+
+
+def _cpu_count():
+    """CPUs this process may actually run on (respects container CPU affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# gthread workers: requests mostly wait on Postgres/MySQL, SMTP and Hugging Face
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Every worker pools up to DB_POOL_MAX_SIZE connections: one per request
+# thread plus the generation job threads and the review-event flusher.
+# workers * pool size must stay within the budget, which in turn should sit
+# below the database's max_connections (100 by default on PostgreSQL) to
+# leave room for the migrate step and admin sessions.
+db_connection_budget = int(os.getenv('DB_CONNECTION_BUDGET', '80'))
+db_pool_max_size = int(os.getenv('DB_POOL_MAX_SIZE',
+                                 str(threads + int(os.getenv('GENERATION_WORKERS', '4')) + 1)))
+workers = int(os.getenv('WEB_CONCURRENCY', str(
+    max(1, min(_cpu_count() * 2 + 1, db_connection_budget // db_pool_max_size)))))
+if 'DB_POOL_MAX_SIZE' not in os.environ:
+    # With WEB_CONCURRENCY set by hand, shrink the pools rather than overrun the budget.
+    # Set before the app is preloaded, which reads it.
+    db_pool_max_size = max(1, min(db_pool_max_size, db_connection_budget // workers))
+    os.environ['DB_POOL_MAX_SIZE'] = str(db_pool_max_size)
+
+# Import the app once in the master; workers inherit it copy-on-write
+preload_app = True
+
+# Recycle workers gracefully to cap memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '45'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    # The master never serves requests: close any connection it opened so no
+    # socket is shared with the forked workers (preloading itself opens none;
+    # each worker checks the schema version on its first database use)
+    import app
+    app.close_db_pool()
+    app.reset_db_pool()
+    total = server.cfg.workers * app.DB_POOL_MAX_SIZE
+    log = server.log.warning if total > db_connection_budget else server.log.info
+    log("%s workers x %s pooled connections = up to %s database connections (budget %s)",
+        server.cfg.workers, app.DB_POOL_MAX_SIZE, total, db_connection_budget)
+    # Metric snapshots from a previous run would be added to this run's totals
+    app.metrics.reset()
+
+
+def post_fork(server, worker):
+    # Drop any pool inherited from the master without touching its sockets
+    import app
+    app.reset_db_pool()
+
+
+def post_worker_init(worker):
+    import app
+    app.warm_db_pool()
+    # Pick up mail queued before a restart
+    app.mail_queue.start()
+
+
+def worker_exit(server, worker):
+    # Let in-flight generation jobs finish, flush buffered review events and
+    # queued mail, then release database connections
+    import app
+    app.generation_jobs.shutdown(wait=True)
+    app.review_events.close()
+    app.mail_queue.close()
+    app.close_db_pool()
+    # Final snapshot, so requests served since the last flush still count
+    app.metrics.flush()
@@ -0,0 +1,182 @@
+"""
+Resilient client for the Hugging Face inference API
+
+Wraps a pooled keep-alive requests.Session with connect/read timeouts,
+jittered retries while the model is loading (HTTP 503) and a circuit
+breaker that fails fast while the endpoint is unhealthy, so callers can
+go straight to the local fallback generator.
+"""
+import random
+import threading
+import time
+
+import requests  # pyright: ignore[reportMissingModuleSource]
+from requests.adapters import HTTPAdapter  # pyright: ignore[reportMissingModuleSource]
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+
+class InferenceError(Exception):
+    """The inference call failed; callers should use the fallback generator"""
+
+
+class CircuitOpenError(InferenceError):
+    """The circuit breaker is open, so the call was not attempted"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after reset_timeout"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = BREAKER_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go out now"""
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = BREAKER_HALF_OPEN
+            if self.state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = BREAKER_CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == BREAKER_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != BREAKER_OPEN:
+                    self.times_opened += 1
+                self.state = BREAKER_OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class InferenceClient:
+    """POSTs to one inference endpoint with timeouts, retries and a circuit breaker"""
+
+    def __init__(self, url, headers=None, connect_timeout=3.05, read_timeout=30,
+                 max_retries=2, backoff_base=0.5, backoff_max=8,
+                 failure_threshold=5, reset_timeout=60, pool_size=10, on_call=None):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.on_call = on_call  # on_call(seconds, outcome), e.g. to feed a latency histogram
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'short_circuited': 0,
+            'latency_total_seconds': 0.0,
+            'latency_max_seconds': 0.0,
+            'last_latency_seconds': None,
+            'last_error': None,
+        }
+
+    def post(self, payload):
+        """POST payload as JSON and return the decoded response; raises InferenceError"""
+        if not self.breaker.allow():
+            self._bump('short_circuited')
+            if self.on_call is not None:
+                self.on_call(0.0, 'short_circuited')
+            raise CircuitOpenError("Inference endpoint unhealthy; circuit breaker is open")
+
+        start = time.monotonic()
+        try:
+            result = self._post_with_retries(payload)
+        except Exception as e:
+            self.breaker.record_failure()
+            self._record_call(start, error=e)
+            if isinstance(e, InferenceError):
+                raise
+            raise InferenceError(str(e)) from e
+        self.breaker.record_success()
+        self._record_call(start)
+        return result
+
+    def metrics(self):
+        """Breaker state and latency counters for this process"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        completed = metrics['successes'] + metrics['failures']
+        metrics['latency_avg_seconds'] = (
+            round(metrics['latency_total_seconds'] / completed, 4) if completed else None)
+        metrics['breaker_state'] = self.breaker.state
+        metrics['breaker_consecutive_failures'] = self.breaker.consecutive_failures
+        metrics['breaker_times_opened'] = self.breaker.times_opened
+        return metrics
+
+    def _post_with_retries(self, payload):
+        attempt = 0
+        while True:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code != 503 or attempt >= self.max_retries:
+                raise InferenceError(f"Inference endpoint returned HTTP {response.status_code}")
+
+            # 503 means the model is still loading; HF may tell us how long to wait
+            attempt += 1
+            self._bump('retries')
+            time.sleep(self._backoff(attempt, response))
+
+    def _backoff(self, attempt, response):
+        """Full-jitter exponential backoff, nudged by the server's estimated_time hint"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        try:
+            estimated = float(response.json().get('estimated_time', 0))
+            delay = min(self.backoff_max, max(delay, estimated))
+        except Exception:
+            pass
+        return random.uniform(0, delay)
+
+    def _record_call(self, start, error=None):
+        latency = time.monotonic() - start
+        with self._metrics_lock:
+            self._metrics['requests'] += 1
+            self._metrics['failures' if error else 'successes'] += 1
+            self._metrics['latency_total_seconds'] += latency
+            self._metrics['latency_max_seconds'] = max(self._metrics['latency_max_seconds'], latency)
+            self._metrics['last_latency_seconds'] = round(latency, 4)
+            if error:
+                self._metrics['last_error'] = str(error)[:200]
+        if self.on_call is not None:
+            if error is None:
+                outcome = 'success'
+            elif isinstance(error, requests.exceptions.Timeout):
+                outcome = 'timeout'
+            else:
+                outcome = 'error'
+            self.on_call(latency, outcome)
+
+    def _bump(self, name):
+        with self._metrics_lock:
+            self._metrics[name] += 1
@@ -0,0 +1,140 @@
+"""
+Background job queue for EduVerse (flashcard generation runs here, off the request thread)
+"""
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class Job:
+    """State of one background job; handed to the job function for progress updates"""
+
+    def __init__(self, queue, job_id, kind, owner):
+        self._queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.owner = owner
+        self.status = JOB_QUEUED
+        self.progress = 0
+        self.message = 'Waiting for a worker...'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def update(self, progress=None, message=None):
+        """Report progress (0-100) and a short human-readable message"""
+        if progress is not None:
+            self.progress = max(0, min(100, int(progress)))
+        if message is not None:
+            self.message = message
+        self._queue._touch(self)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'owner': self.owner,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class JobQueue:
+    """Bounded worker pool that runs jobs in the background and tracks their status
+
+    A store object (with save(job_dict) and load(job_id)) can be supplied so
+    other worker processes can answer status polls for jobs they did not run.
+    """
+
+    def __init__(self, max_workers=4, max_pending=100, result_ttl=3600, store=None):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='eduverse-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, owner, func, *args, **kwargs):
+        """Queue func(job, *args, **kwargs) and return the new job id"""
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values()
+                          if job.status in (JOB_QUEUED, JOB_RUNNING))
+            if pending >= self.max_pending:
+                raise QueueFull("Too many jobs in progress, please try again shortly")
+            job = Job(self, uuid.uuid4().hex, kind, owner)
+            self._jobs[job.id] = job
+        self._persist(job)
+        # Run in a copy of the submitter's context so the job's log records keep its request ID
+        self._executor.submit(contextvars.copy_context().run, self._run, job, func, args, kwargs)
+        return job.id
+
+    def get(self, job_id):
+        """Return the job's status dict, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        if self.store is not None:
+            try:
+                return self.store.load(job_id)
+            except Exception as e:
+                logger.error("Error loading job %s: %s", job_id, e)
+        return None
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job, func, args, kwargs):
+        job.status = JOB_RUNNING
+        job.update(progress=5, message='Started')
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.status = JOB_DONE
+            job.update(progress=100, message='Finished')
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job.id, job.kind, e)
+            job.error = str(e)
+            job.status = JOB_FAILED
+            job.update(message='Failed')
+
+    def _touch(self, job):
+        job.updated_at = time.time()
+        self._persist(job)
+
+    def _persist(self, job):
+        if self.store is None:
+            return
+        try:
+            self.store.save(job.to_dict())
+        except Exception as e:
+            logger.error("Error saving job %s: %s", job.id, e)
+
+    def _prune(self):
+        """Forget finished jobs older than result_ttl (lock held)"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in (JOB_DONE, JOB_FAILED) and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,341 @@
+"""
+Durable outbound mail queue
+
+Messages are written to a SQLite outbox before the request returns, and a
+background thread in each worker process claims them in batches and sends
+them over one persistent SMTP connection, reconnecting only when the
+server drops it or it has been idle too long. Failed sends are retried
+with jittered exponential backoff; permanent SMTP errors (5xx) and
+messages that exhaust their attempts are marked failed. Messages queued
+as sensitive (verification codes) lose their body once they are sent or
+have failed, so the outbox never keeps a usable code for its retention
+period.
+"""
+import json
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+# Blanks a sensitive message's content when it leaves the pending state
+REDACT_SENSITIVE = ("body = CASE WHEN sensitive THEN '' ELSE body END, "
+                    "html = CASE WHEN sensitive THEN NULL ELSE html END")
+
+
+class SMTPSettings:
+    """Where and how to connect for outbound mail"""
+
+    def __init__(self, host, port=587, username='', password='', use_tls=True,
+                 use_ssl=False, timeout=15, default_sender=''):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.default_sender = default_sender or username
+
+
+class MailQueue:
+    """Outbox in SQLite plus a per-process sender thread"""
+
+    def __init__(self, path, smtp, batch_size=20, poll_interval=5.0, max_attempts=5,
+                 backoff_base=30, backoff_max=3600, idle_timeout=60,
+                 claim_timeout=300, keep_sent_seconds=7 * 24 * 3600):
+        self.path = path
+        self.smtp = smtp
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+        self.claim_timeout = claim_timeout
+        self.keep_sent_seconds = keep_sent_seconds
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.connections_opened = 0
+
+        self._local = threading.local()
+        self._cond = threading.Condition(threading.Lock())
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._wake = False
+        self._server = None
+        self._server_last_used = 0.0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sender TEXT,
+                recipients TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                body TEXT NOT NULL,
+                html TEXT,
+                sensitive INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claimed_at REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                sent_at REAL
+            )
+        """)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(outbox)")}
+        if 'sensitive' not in columns:
+            connection.execute("ALTER TABLE outbox ADD COLUMN sensitive INTEGER NOT NULL DEFAULT 0")
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON outbox (status, next_attempt_at)")
+
+    def enqueue(self, recipients, subject, body, html=None, sender=None, sensitive=False):
+        """Durably queue a message and return its outbox id; sending happens in the background
+        
+        A sensitive message's body is blanked as soon as it is sent or fails for good.
+        """
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        now = time.time()
+        cursor = self._connection().execute("""
+            INSERT INTO outbox (sender, recipients, subject, body, html, sensitive, status, next_attempt_at,
+                                created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (sender, json.dumps(recipients), subject, body, html, int(sensitive), STATUS_PENDING, now, now))
+        with self._cond:
+            self._wake = True
+            self._cond.notify()
+        self._ensure_thread()
+        return cursor.lastrowid
+
+    def process_batch(self):
+        """Claim and send one batch of due messages; returns how many were sent"""
+        batch = self._claim()
+        if not batch:
+            self._close_idle_server()
+            return 0
+
+        sent = 0
+        for row in batch:
+            message_id, attempts = row[0], row[6]
+            try:
+                self._send(self._build_message(row))
+            except Exception as e:
+                self._record_failure(message_id, attempts + 1, e)
+                continue
+            self._connection().execute(
+                f"UPDATE outbox SET status = ?, attempts = ?, sent_at = ?, last_error = NULL, {REDACT_SENSITIVE} "
+                f"WHERE id = ?",
+                (STATUS_SENT, attempts + 1, time.time(), message_id))
+            sent += 1
+        with self._cond:
+            self.sent += sent
+        return sent
+
+    def drain(self, timeout=30):
+        """Send everything that is due now (used at shutdown and in tests)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.process_batch():
+            pass
+
+    def close(self):
+        """Stop the sender thread, send what is due and close the SMTP connection"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=self.poll_interval + 5)
+        try:
+            self.drain(timeout=10)
+        finally:
+            self._quit_server()
+
+    def stats(self):
+        counts = dict(self._connection().execute(
+            "SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        with self._cond:
+            return {
+                'pending': counts.get(STATUS_PENDING, 0) + counts.get(STATUS_SENDING, 0),
+                'sent_total': counts.get(STATUS_SENT, 0),
+                'failed_total': counts.get(STATUS_FAILED, 0),
+                'sent': self.sent,
+                'failed': self.failed,
+                'retried': self.retried,
+                'connections_opened': self.connections_opened,
+            }
+
+    def _claim(self):
+        """Atomically mark up to batch_size due messages as ours, across all processes"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # A claim older than claim_timeout belongs to a worker that died mid-send
+            connection.execute("""
+                UPDATE outbox SET status = ? WHERE status = ? AND claimed_at < ?
+            """, (STATUS_PENDING, STATUS_SENDING, now - self.claim_timeout))
+            rows = connection.execute("""
+                SELECT id, sender, recipients, subject, body, html, attempts FROM outbox
+                WHERE status = ? AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id LIMIT ?
+            """, (STATUS_PENDING, now, self.batch_size)).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE outbox SET status = ?, claimed_at = ? WHERE id = ?",
+                    [(STATUS_SENDING, now, row[0]) for row in rows])
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _build_message(self, row):
+        _, sender, recipients, subject, body, html, _ = row
+        message = EmailMessage()
+        message['From'] = sender or self.smtp.default_sender
+        message['To'] = ', '.join(json.loads(recipients))
+        message['Subject'] = subject
+        message.set_content(body)
+        if html:
+            message.add_alternative(html, subtype='html')
+        return message
+
+    def _send(self, message):
+        """Send over the persistent connection, reconnecting once if the server dropped it"""
+        for attempt in range(2):
+            server = self._get_server()
+            try:
+                server.send_message(message)
+                self._server_last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                pass
+            except smtplib.SMTPException:
+                raise
+            except OSError:
+                pass  # socket-level failure: the connection is unusable
+            self._quit_server()
+            if attempt:
+                raise smtplib.SMTPServerDisconnected("SMTP connection lost twice while sending")
+
+    def _record_failure(self, message_id, attempts, error):
+        # Rejections of this particular message will not succeed on retry; connection
+        # and login problems affect every message and are retried instead
+        permanent = isinstance(error, smtplib.SMTPRecipientsRefused) or (
+            isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)) and error.smtp_code >= 500)
+        redact = ''
+        if permanent or attempts >= self.max_attempts:
+            status, next_attempt_at = STATUS_FAILED, time.time()
+            redact = f', {REDACT_SENSITIVE}'
+            with self._cond:
+                self.failed += 1
+            logger.error("Mail %s failed permanently after %s attempts: %s", message_id, attempts, error)
+        else:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+            status, next_attempt_at = STATUS_PENDING, time.time() + random.uniform(delay / 2, delay)
+            with self._cond:
+                self.retried += 1
+            logger.warning("Mail %s attempt %s failed, retrying: %s", message_id, attempts, error)
+        self._connection().execute(f"""
+            UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?{redact} WHERE id = ?
+        """, (status, attempts, next_attempt_at, str(error)[:500], message_id))
+
+    def _get_server(self):
+        if self._server is not None and time.monotonic() - self._server_last_used > self.idle_timeout:
+            self._quit_server()
+        if self._server is None:
+            settings = self.smtp
+            if settings.use_ssl:
+                server = smtplib.SMTP_SSL(settings.host, settings.port, timeout=settings.timeout)
+            else:
+                server = smtplib.SMTP(settings.host, settings.port, timeout=settings.timeout)
+                if settings.use_tls:
+                    server.starttls()
+            if settings.username and settings.password:
+                server.login(settings.username, settings.password)
+            self._server = server
+            self._server_last_used = time.monotonic()
+            self.connections_opened += 1
+        return self._server
+
+    def _close_idle_server(self):
+        if self._server is not None and time.monotonic() - self._server_last_used > self.idle_timeout:
+            self._quit_server()
+
+    def _quit_server(self):
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+    def _prune_sent(self):
+        self._connection().execute(
+            "DELETE FROM outbox WHERE status = ? AND sent_at < ?",
+            (STATUS_SENT, time.time() - self.keep_sent_seconds))
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._server = None  # the parent's SMTP socket is not ours
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='mail-queue', daemon=True)
+            self._thread.start()
+
+    def start(self):
+        """Start this process's sender thread, e.g. to pick up mail queued before a restart"""
+        self._ensure_thread()
+
+    def _run(self):
+        last_prune = 0.0
+        while True:
+            with self._cond:
+                if not self._wake and not self._stopping:
+                    self._cond.wait(self.poll_interval)
+                self._wake = False
+                if self._stopping:
+                    return
+            try:
+                while self.process_batch():
+                    pass
+                if time.monotonic() - last_prune > 3600:
+                    self._prune_sent()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                logger.error("Mail queue error: %s", e)
+
+    def _connection(self):
+        """One autocommit SQLite connection per thread (and per process after a fork)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
@@ -0,0 +1,321 @@
+"""
+Counters and histograms exposed in Prometheus text format across worker processes
+
+Values live in process memory, so recording is a dict update under a
+lock. Each process writes a snapshot of its values to
+<directory>/<pid>-<nonce>.json every flush_interval seconds, and render()
+merges every snapshot (its own taken fresh), so /metrics reports totals
+for the whole server no matter which worker answers the scrape.
+
+A snapshot that has not been refreshed for a few intervals belongs to an
+exited worker: its counters and histograms are folded into an archive
+file so totals never go backwards, and its gauges are dropped. Other
+workers' values may lag by up to one flush interval.
+"""
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = 'archive.lock'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    def __init__(self, registry, name, help, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.registry._ensure_thread()
+        with self.registry._lock:
+            self.registry._check_fork()
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, help, labelnames, buckets):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        self.registry._ensure_thread()
+        with self.registry._lock:
+            self.registry._check_fork()
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts with +Inf last, then sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+
+class _Collected(_Metric):
+    """Values read from fn() when a snapshot is taken; fn returns {label values tuple: value}"""
+
+    def __init__(self, registry, name, help, labelnames, fn, type):
+        super().__init__(registry, name, help, labelnames)
+        self.fn = fn
+        self.type = type
+
+    def collect(self):
+        return {tuple(str(v) for v in key): value for key, value in self.fn().items()}
+
+
+class Registry:
+    """Metric definitions plus this process's values and the snapshot files of every process"""
+
+    def __init__(self, directory, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._path = None
+        self._thread_pid = None
+        os.makedirs(directory, exist_ok=True)
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def counter_from(self, name, help, fn, labelnames=()):
+        """A counter whose per-process totals are kept elsewhere, e.g. in a component's stats"""
+        return self._register(_Collected(self, name, help, labelnames, fn, 'counter'))
+
+    def gauge_from(self, name, help, fn, labelnames=()):
+        """A per-process gauge, summed over the workers that are still running"""
+        return self._register(_Collected(self, name, help, labelnames, fn, 'gauge'))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _check_fork(self):
+        """Start from zero in a forked child (lock held), so the parent's counts are not reported twice"""
+        if self._pid != os.getpid():
+            for metric in self._metrics.values():
+                metric._values = {}
+            self._pid = os.getpid()
+            self._path = None
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+
+    def start(self):
+        """Start this process's snapshot thread (also started by the first render)"""
+        self._ensure_thread()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass  # never let a full disk take the worker down; the next flush retries
+
+    def snapshot(self):
+        """This process's values as plain data"""
+        snapshot = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        with self._lock:
+            self._check_fork()
+            for metric in self._metrics.values():
+                if isinstance(metric, Counter):
+                    values = dict(metric._values)
+                elif isinstance(metric, Histogram):
+                    values = {key: list(state) for key, state in metric._values.items()}
+                else:
+                    continue
+                if values:
+                    kind = 'counters' if metric.type == 'counter' else 'histograms'
+                    snapshot[kind][metric.name] = [[list(key), value] for key, value in values.items()]
+        # Collected metrics read other components' state, so call them outside our lock
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, _Collected):
+                try:
+                    values = metric.collect()
+                except Exception:
+                    continue
+                kind = 'counters' if metric.type == 'counter' else 'gauges'
+                snapshot[kind][metric.name] = [[list(key), value] for key, value in values.items()]
+        return snapshot
+
+    def flush(self):
+        """Write this process's snapshot file"""
+        with self._lock:
+            self._check_fork()
+            if self._path is None:
+                self._path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            path = self._path
+        self._write(path, self.snapshot())
+
+    def render(self):
+        """Prometheus text for all processes"""
+        self._ensure_thread()
+        self.flush()
+        self._archive_stale()
+        merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            snapshot = self._read(os.path.join(self.directory, name))
+            if snapshot is None:
+                continue
+            _merge(merged, snapshot, include_gauges=name != ARCHIVE_FILE)
+        return self._format(merged)
+
+    def reset(self):
+        """Delete every snapshot (run once when the server starts, before workers fork)"""
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _archive_stale(self):
+        """Fold snapshots of workers that stopped refreshing them into the archive"""
+        cutoff = time.time() - self.flush_interval * 3
+        stale = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or name == ARCHIVE_FILE:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff and path != self._path:
+                    stale.append(path)
+            except FileNotFoundError:
+                continue
+        if not stale:
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            archive = self._read(archive_path) or {'counters': {}, 'histograms': {}, 'gauges': {}}
+            merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+            _merge(merged, archive, include_gauges=False)
+            folded = []
+            for path in stale:
+                snapshot = self._read(path)  # None if another scraper already folded it
+                if snapshot is not None:
+                    _merge(merged, snapshot, include_gauges=False)
+                    folded.append(path)
+            if folded:
+                self._write(archive_path, _unmerge(merged))
+                for path in folded:
+                    os.remove(path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path, data):
+        # Write then rename, so readers never see a half-written file
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _format(self, merged):
+        lines = []
+        for metric in self._metrics.values():
+            kind = {'counter': 'counters', 'gauge': 'gauges', 'histogram': 'histograms'}[metric.type]
+            values = merged[kind].get(metric.name)
+            if not values:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for key, value in sorted(values.items()):
+                if metric.type != 'histogram':
+                    lines.append(f'{metric.name}{_format_labels(metric.labelnames, key)} {_format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    labels = _format_labels(metric.labelnames, key, ('le', _format_number(float(bound))))
+                    lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f'{metric.name}_sum{labels} {_format_number(value[-1])}')
+                lines.append(f'{metric.name}_count{labels} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _merge(merged, snapshot, include_gauges=True):
+    """Add a snapshot's values into merged ({kind: {name: {label tuple: value}}})"""
+    for kind in ('counters', 'gauges', 'histograms'):
+        if kind == 'gauges' and not include_gauges:
+            continue
+        for name, entries in snapshot.get(kind, {}).items():
+            target = merged[kind].setdefault(name, {})
+            for labels, value in entries:
+                key = tuple(labels)
+                if kind == 'histograms':
+                    current = target.get(key)
+                    if current is None or len(current) != len(value):
+                        target[key] = list(value)
+                    else:
+                        target[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target[key] = target.get(key, 0) + value
+
+
+def _unmerge(merged):
+    """Inverse of _merge's layout, for writing the archive"""
+    return {kind: {name: [[list(key), value] for key, value in values.items()]
+                   for name, values in merged[kind].items()}
+            for kind in ('counters', 'histograms', 'gauges')}
@@ -0,0 +1,154 @@
+"""
+Versioned schema migrations
+
+Each migration is a (version, name, apply) triple, where apply(cursor)
+makes the change and raises on failure. Applied versions are recorded in
+the schema_version table. They are applied by `flask --app app migrate`
+as a release step before the workers start; a worker only reads the
+recorded versions (one SELECT) and refuses database work while any are
+pending. Pending migrations run under a database advisory lock
+(pg_advisory_lock on PostgreSQL, GET_LOCK on MySQL): when several release
+steps run together exactly one applies them, and the others wait for the
+lock and then find nothing left to do.
+
+PostgreSQL runs each migration and its version row in one transaction.
+MySQL commits DDL implicitly, so migrations must be safe to re-run after
+a partial failure.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_TABLE = 'schema_version'
+LOCK_NAME = 'eduverse_migrations'
+PG_LOCK_KEY = 0x45445556  # any bigint works, as long as every process uses the same one
+
+
+class MigrationError(Exception):
+    """A migration failed, or the migration lock could not be taken"""
+
+
+class Migrator:
+    """Applies pending migrations in version order, once across all processes"""
+
+    def __init__(self, connect, db_type, migrations, lock_timeout=300):
+        self.connect = connect
+        self.db_type = db_type
+        self.migrations = sorted(migrations, key=lambda migration: migration[0])
+        self.lock_timeout = lock_timeout
+
+    @property
+    def latest_version(self):
+        return self.migrations[-1][0] if self.migrations else 0
+
+    def applied_versions(self, connection):
+        """Versions recorded in schema_version (empty before the first migration)"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"SELECT version FROM {SCHEMA_VERSION_TABLE}")
+            versions = {row[0] for row in cursor.fetchall()}
+        except Exception:
+            # Table missing; on PostgreSQL the failed statement also aborted the transaction
+            connection.rollback()
+            return set()
+        finally:
+            cursor.close()
+        connection.commit()  # do not hold a snapshot open while waiting for the lock
+        return versions
+
+    def pending(self, connection):
+        applied = self.applied_versions(connection)
+        return [migration for migration in self.migrations if migration[0] not in applied]
+
+    def pending_versions(self):
+        """Versions not yet applied, read without taking the lock or changing anything"""
+        connection = self.connect()
+        try:
+            return [migration[0] for migration in self.pending(connection)]
+        finally:
+            connection.close()
+
+    def migrate(self):
+        """Apply every pending migration; returns the versions this call applied"""
+        connection = self.connect()
+        try:
+            if not self.pending(connection):
+                return []
+            self._lock(connection)
+            try:
+                self._ensure_version_table(connection)
+                # Re-read under the lock: another process may have applied them while we waited
+                applied = []
+                for version, name, apply in self.pending(connection):
+                    started = time.monotonic()
+                    self._apply(connection, version, name, apply)
+                    logger.info("Applied migration %s (%s) in %.2fs", version, name, time.monotonic() - started)
+                    applied.append(version)
+                return applied
+            finally:
+                self._unlock(connection)
+        finally:
+            connection.close()
+
+    def _apply(self, connection, version, name, apply):
+        if self.db_type != 'postgresql':
+            connection.begin()
+        cursor = connection.cursor()
+        try:
+            apply(cursor)
+            cursor.execute(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, name) VALUES (%s, %s)",
+                           (version, name))
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            raise MigrationError(f"Migration {version} ({name}) failed: {e}") from e
+        finally:
+            cursor.close()
+
+    def _ensure_version_table(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                    version INT PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            connection.commit()
+        finally:
+            cursor.close()
+
+    def _lock(self, connection):
+        """Take the session-level migration lock, waiting up to lock_timeout seconds"""
+        cursor = connection.cursor()
+        try:
+            if self.db_type == 'postgresql':
+                deadline = time.monotonic() + self.lock_timeout
+                while True:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", (PG_LOCK_KEY,))
+                    locked = cursor.fetchone()[0]
+                    connection.commit()
+                    if locked or time.monotonic() >= deadline:
+                        break
+                    time.sleep(0.5)
+            else:
+                cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, self.lock_timeout))
+                locked = cursor.fetchone()[0] == 1
+        finally:
+            cursor.close()
+        if not locked:
+            raise MigrationError(f"Timed out after {self.lock_timeout}s waiting for the migration lock")
+
+    def _unlock(self, connection):
+        cursor = connection.cursor()
+        try:
+            if self.db_type == 'postgresql':
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (PG_LOCK_KEY,))
+            else:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+            connection.commit()
+        finally:
+            cursor.close()
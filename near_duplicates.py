@@ -0,0 +1,122 @@
+"""
+MinHash/LSH signatures for spotting near-duplicate flashcard questions
+
+Each question is reduced to a fixed-size MinHash signature over its
+character trigrams, so a changed article or plural ending moves the score
+only a little; signatures are split into bands, and two questions that
+share any band hash are candidate duplicates. Candidates are confirmed by
+the exact Jaccard similarity of their shingles when both texts are at
+hand, and by the similarity their signatures estimate otherwise. Hashes
+are deterministic so signatures stored in the database stay comparable
+across processes.
+"""
+import hashlib
+import random
+import re
+import struct
+import zlib
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+DEFAULT_THRESHOLD = 0.7
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = 0xFFFFFFFF
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = tuple((_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+                      for _ in range(NUM_PERMUTATIONS))
+del _rng
+
+_NON_WORD = re.compile(r'[\W_]+')
+_SIGNATURE_FORMAT = '>%dI' % NUM_PERMUTATIONS
+
+SIGNATURE_LENGTH = NUM_PERMUTATIONS * 8  # hex characters
+
+
+def shingles(text):
+    """Character trigrams of the normalized text, padded so word starts and ends count"""
+    words = _NON_WORD.sub(' ', text.lower()).split()
+    if not words:
+        return set()
+    padded = f" {' '.join(words)} "
+    return {padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two shingle sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(text):
+    """MinHash signature of text as a tuple of NUM_PERMUTATIONS 32-bit ints"""
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles(text)]
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERMUTATIONS
+    return tuple(min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH
+                 for a, b in _PERMUTATIONS)
+
+
+def encode_signature(signature):
+    return struct.pack(_SIGNATURE_FORMAT, *signature).hex()
+
+
+def decode_signature(encoded):
+    return struct.unpack(_SIGNATURE_FORMAT, bytes.fromhex(encoded))
+
+
+def band_hashes(signature):
+    """One signed 64-bit hash per LSH band, suitable for a BIGINT column"""
+    hashes = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(struct.pack('>B%dI' % ROWS_PER_BAND, band, *rows),
+                                 digest_size=8).digest()
+        hashes.append(int.from_bytes(digest, 'big', signed=True))
+    return hashes
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERMUTATIONS
+
+
+class SignatureIndex:
+    """In-memory LSH index, used to catch duplicates inside one batch of new cards"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._buckets = {}
+        self._signatures = {}
+        self._shingles = {}
+
+    def add(self, key, signature, bands=None, text=None):
+        self._signatures[key] = signature
+        if text is not None:
+            self._shingles[key] = shingles(text)
+        for band_hash in bands or band_hashes(signature):
+            self._buckets.setdefault(band_hash, []).append(key)
+
+    def candidates(self, bands):
+        found = []
+        for band_hash in bands:
+            for key in self._buckets.get(band_hash, ()):
+                if key not in found:
+                    found.append(key)
+        return found
+
+    def find(self, signature, bands=None, text=None):
+        """Key of the most similar indexed entry at or above threshold, or None"""
+        best_key, best_score = None, self.threshold
+        text_shingles = shingles(text) if text is not None else None
+        for key in self.candidates(bands or band_hashes(signature)):
+            if text_shingles is not None and key in self._shingles:
+                score = jaccard(text_shingles, self._shingles[key])
+            else:
+                score = similarity(signature, self._signatures[key])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
@@ -0,0 +1,172 @@
+"""
+Map-reduce flashcard generation for large notes
+
+Notes are split on section and paragraph boundaries into chunks that fit
+one model prompt. Each chunk is generated concurrently on a bounded
+thread pool with its own deadline, and the cards of all chunks are ranked
+together and picked down to the requested count, dropping near-duplicate
+questions.
+"""
+import logging
+import math
+import re
+import time
+from collections import Counter
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from near_duplicates import DEFAULT_THRESHOLD, SignatureIndex, jaccard, minhash, shingles
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n+')
+_HEADING = re.compile(r'^(?:#{1,6}\s|[A-Z0-9][^\n]{0,80}:\s*$|(?:chapter|section|unit|lecture|part)\s+\w+)',
+                      re.IGNORECASE)
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+_NORMALIZE = re.compile(r'[\W_]+')
+
+OVERGENERATE_FACTOR = 1.5
+SIMILARITY_PENALTY = 0.5  # per unit of overlap with the closest card already picked
+TYPE_PENALTY = 0.25  # per share of picked cards with the same question type
+
+
+def split_notes(notes, max_chars):
+    """Split notes into chunks of at most max_chars, preferring section then paragraph breaks"""
+    chunks = []
+    current = []
+    current_len = 0
+
+    def flush():
+        nonlocal current, current_len
+        if current:
+            chunks.append('\n\n'.join(current))
+        current = []
+        current_len = 0
+
+    for paragraph in _PARAGRAPH_BREAK.split(notes):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # A new section starts a new chunk unless the current one is still small
+        if _HEADING.match(paragraph) and current_len >= max_chars // 2:
+            flush()
+        for piece in _split_long(paragraph, max_chars):
+            if current and current_len + len(piece) + 2 > max_chars:
+                flush()
+            current.append(piece)
+            current_len += len(piece) + 2
+    flush()
+    return chunks
+
+
+def _split_long(text, max_chars):
+    """Break an oversized paragraph on sentences, and oversized sentences on whitespace"""
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    buffer = ''
+    for sentence in _SENTENCE_BREAK.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if buffer:
+                pieces.append(buffer)
+                buffer = ''
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if buffer and len(buffer) + len(sentence) + 1 > max_chars:
+            pieces.append(buffer)
+            buffer = ''
+        buffer = f"{buffer} {sentence}" if buffer else sentence
+    if buffer:
+        pieces.append(buffer)
+    return [piece for piece in pieces if piece]
+
+
+def select_chunks(chunks, max_chunks):
+    """Keep at most max_chunks, spread evenly over the notes so every part is covered"""
+    if len(chunks) <= max_chunks:
+        return chunks
+    step = len(chunks) / max_chunks
+    return [chunks[int(i * step)] for i in range(max_chunks)]
+
+
+def allocate_cards(chunks, num_cards):
+    """Cards to request per chunk: proportional to chunk length, with headroom for dedupe"""
+    total = sum(len(chunk) for chunk in chunks) or 1
+    target = num_cards * OVERGENERATE_FACTOR
+    return [max(1, math.ceil(target * len(chunk) / total)) for chunk in chunks]
+
+
+def card_key(card):
+    """Normalized question text used to spot duplicate cards"""
+    return _NORMALIZE.sub(' ', card.get('question', '').lower()).strip()
+
+
+def merge_cards(card_lists, num_cards, reserve=None, threshold=DEFAULT_THRESHOLD):
+    """Rank the cards of every chunk together and pick num_cards, skipping near-duplicates
+
+    A card's relevance comes from its place in its own chunk's list, since
+    each chunk lists its strongest cards first. Picks are greedy: relevance
+    minus a penalty for similarity to the cards already picked and for
+    repeating their question type, so the set stays varied. A question at
+    or above threshold similarity to a picked one (MinHash candidates,
+    confirmed on shingles) is dropped. Reserve cards are only used once
+    the chunk cards run out.
+    """
+    candidates = []
+    for cards, base in [(cards, 1.0) for cards in card_lists] + [(reserve or [], -1.0)]:
+        for position, card in enumerate(cards):
+            if card_key(card):
+                candidates.append((base - position / len(cards), card, shingles(card['question'])))
+
+    merged = []
+    picked_shingles = []
+    types = Counter()
+    index = SignatureIndex(threshold)
+
+    def score(candidate):
+        relevance, card, question_shingles = candidate
+        overlap = max((jaccard(question_shingles, other) for other in picked_shingles), default=0.0)
+        repeats = types[card.get('type')] / len(merged) if merged else 0.0
+        return relevance - SIMILARITY_PENALTY * overlap - TYPE_PENALTY * repeats
+
+    while candidates and len(merged) < num_cards:
+        best = max(range(len(candidates)), key=lambda i: score(candidates[i]))
+        _, card, question_shingles = candidates.pop(best)
+        signature = minhash(card['question'])
+        if index.find(signature, text=card['question']) is not None:
+            continue
+        index.add(len(merged), signature, text=card['question'])
+        merged.append(card)
+        picked_shingles.append(question_shingles)
+        types[card.get('type')] += 1
+    return merged
+
+
+def map_chunks(executor, max_workers, chunks, quotas, generate, fallback, timeout):
+    """Run generate(chunk, quota) for every chunk on executor and return the card lists in order
+
+    A chunk that raises or misses its deadline is answered by
+    fallback(chunk, quota) instead, so one slow chunk cannot stall the
+    whole request. Chunks queued behind a full pool get extra time for
+    each batch of work ahead of them.
+    """
+    workers = max(1, max_workers)
+    started = time.monotonic()
+    futures = [executor.submit(generate, chunk, quota) for chunk, quota in zip(chunks, quotas)]
+
+    results = []
+    for index, (future, chunk, quota) in enumerate(zip(futures, chunks, quotas)):
+        deadline = started + timeout * (1 + index // workers)
+        try:
+            cards = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeout:
+            future.cancel()
+            logger.warning("Chunk %s/%s timed out after %ss; using fallback cards", index + 1, len(chunks), timeout)
+            cards = fallback(chunk, quota)
+        except Exception as e:
+            logger.warning("Chunk %s/%s failed: %s; using fallback cards", index + 1, len(chunks), e)
+            cards = fallback(chunk, quota)
+        results.append(cards or [])
+    return results
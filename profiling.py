@@ -0,0 +1,190 @@
+"""
+On-demand CPU and memory profiling for a live worker process
+
+StackSampler reads every thread's stack (sys._current_frames) at a fixed
+interval and counts identical stacks, which is the collapsed-stack format
+read by flamegraph.pl, speedscope and inferno:
+
+    app.py:dashboard;app.py:EduVerse.get_dashboard_data;db_pool.py:TimedCursor.execute 42
+
+It can watch one thread for the length of a request or the whole process
+for a time window; since it samples wall-clock stacks, time spent waiting
+on the database or the network shows up too. RequestProfiler also offers
+cProfile for exact per-function counts (saved as a .prof pstats file).
+
+MemoryProfiler wraps tracemalloc: top-N allocation sites, the difference
+from the previous snapshot, and live bytes by allocation stack in
+collapsed format. Nothing here costs anything until it is started.
+"""
+import cProfile
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+_THREAD_NUMBER = re.compile(r'[-_]?\d+')
+
+
+def _frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}".replace(';', ':')
+
+
+def collapse_stack(frame, root=None):
+    """'outer;...;inner' for a frame and its callers, optionally under a root label"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ';'.join(reversed(names))
+
+
+def format_collapsed(counts):
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+class StackSampler:
+    """Counts collapsed stacks of the chosen threads (all but itself by default) every interval"""
+
+    def __init__(self, interval=0.005, thread_ids=None, exclude_ids=()):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.exclude_ids = set(exclude_ids)
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.counts
+
+    def _run(self):
+        own = threading.get_ident()
+        label_threads = self.thread_ids is None
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()} if label_threads else {}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or thread_id in self.exclude_ids:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                # Pool threads differ only by number; drop it so they share one root
+                root = _THREAD_NUMBER.sub('', names.get(thread_id, 'thread')) if label_threads else None
+                self.counts[collapse_stack(frame, root)] += 1
+            self.samples += 1
+
+
+def sample_process(seconds, interval=0.005):
+    """Sample every other thread of this process for `seconds`; returns collapsed-stack text"""
+    sampler = StackSampler(interval, exclude_ids={threading.get_ident()}).start()
+    time.sleep(seconds)
+    return format_collapsed(sampler.stop())
+
+
+class RequestProfiler:
+    """Profiles the calling thread until stop(); mode is 'sample' or 'cprofile'"""
+
+    def __init__(self, mode='sample', interval=0.001):
+        self.mode = mode
+        if mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # Python 3.12+ allows one cProfile per process; sample this request instead
+                self.mode = 'sample'
+        if self.mode != 'cprofile':
+            self._sampler = StackSampler(interval, thread_ids={threading.get_ident()}).start()
+
+    @property
+    def suffix(self):
+        return '.prof' if self.mode == 'cprofile' else '.collapsed'
+
+    def stop(self):
+        """Return the profile as bytes: a pstats dump or collapsed stacks"""
+        if self.mode == 'cprofile':
+            self._profile.disable()
+            self._profile.create_stats()
+            return marshal.dumps(self._profile.stats)
+        return format_collapsed(self._sampler.stop()).encode('utf-8')
+
+
+class MemoryProfiler:
+    """tracemalloc control with snapshots compared against the previous one"""
+
+    def __init__(self):
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def start(self, frames=25):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = None
+
+    def stop(self):
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {'tracing': tracemalloc.is_tracing(), 'frames': tracemalloc.get_traceback_limit(),
+                'traced_bytes': current, 'peak_bytes': peak}
+
+    def snapshot(self, top=25, group_by='lineno', diff=False):
+        """Top allocation sites (or growth since the last snapshot) plus live bytes as collapsed stacks"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running; start it first")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+        if diff and previous is not None:
+            top_stats = [{'site': str(stat.traceback), 'size_bytes': stat.size, 'size_diff_bytes': stat.size_diff,
+                          'count': stat.count, 'count_diff': stat.count_diff}
+                         for stat in snapshot.compare_to(previous, group_by)[:top]]
+        else:
+            top_stats = [{'site': str(stat.traceback), 'size_bytes': stat.size, 'count': stat.count}
+                         for stat in snapshot.statistics(group_by)[:top]]
+
+        # Flamegraph of live bytes: each allocation stack weighted by its size
+        counts = Counter()
+        for stat in snapshot.statistics('traceback'):
+            stack = ';'.join(f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                             for frame in stat.traceback)  # tracemalloc lists the outermost frame first
+            counts[stack] += stat.size
+        return {'compared_to_previous': bool(diff and previous is not None), 'top': top_stats}, format_collapsed(counts)
+
+
+def save_profile(directory, kind, data, suffix, max_files=50):
+    """Write a profile file as <kind>-<pid>-<timestamp><suffix>, keeping the newest max_files"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{kind}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}-{int(time.time() * 1000) % 1000:03d}{suffix}"
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    with open(os.path.join(directory, name), 'wb') as f:
+        f.write(data)
+    files = sorted((entry for entry in os.scandir(directory) if entry.is_file()),
+                   key=lambda entry: entry.stat().st_mtime)
+    for entry in files[:-max_files]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+    return name
@@ -0,0 +1,188 @@
+"""
+Opt-in per-request SQL profiling
+
+While a profile is active, every statement run through the pool's cursors
+is recorded with the shape of its parameters (types, never values), its
+duration and the EduVerse method that issued it. A profile is active for
+every request when SQL_PROFILE is on, and inside max_queries() /
+assert_max_queries() in tests.
+
+At the end of a request the profile is checked against a query budget,
+statements repeated often enough to suggest an N+1 pattern are reported,
+and slow statements are logged with their EXPLAIN plan.
+
+    with max_queries(6):
+        client.get('/dashboard')
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('query_profile', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r'\s+')
+_EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+_explained = set()  # fingerprints already EXPLAINed by this process
+MAX_EXPLAINED = 1000
+
+
+def fingerprint(statement):
+    """Statement with whitespace collapsed and literals replaced, so repeats compare equal"""
+    if isinstance(statement, bytes):
+        statement = statement.decode('utf-8', 'replace')
+    return _LITERALS.sub('?', _WHITESPACE.sub(' ', str(statement)).strip())[:500]
+
+
+def params_shape(params, many=False):
+    """'(int, str)' for execute parameters, '3 x (int, str)' for executemany"""
+    if params is None:
+        return None
+    if many:
+        rows = params if isinstance(params, (list, tuple)) else []
+        return f"{len(rows)} x {params_shape(rows[0]) if rows else '?'}"
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+    if isinstance(params, (list, tuple)):
+        return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+    return type(params).__name__
+
+
+class QueryRecord:
+    __slots__ = ('statement', 'params', 'params_shape', 'seconds', 'method')
+
+    def __init__(self, statement, params, params_shape, seconds, method):
+        self.statement = statement
+        self.params = params  # kept only for slow statements, to EXPLAIN them
+        self.params_shape = params_shape
+        self.seconds = seconds
+        self.method = method
+
+    def to_dict(self):
+        return {'statement': fingerprint(self.statement), 'params': self.params_shape,
+                'ms': round(self.seconds * 1000, 2), 'method': self.method}
+
+
+class QueryProfile:
+    """Statements recorded for one request (or one max_queries() block)"""
+
+    def __init__(self, label='', slow_seconds=0.25):
+        self.label = label
+        self.slow_seconds = slow_seconds
+        self.queries = []
+        self.started = time.perf_counter()
+
+    def add(self, statement, params, seconds, method, many=False):
+        slow = seconds >= self.slow_seconds
+        self.queries.append(QueryRecord(statement, params if slow and not many else None,
+                                        params_shape(params, many), seconds, method))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_seconds(self):
+        return sum(query.seconds for query in self.queries)
+
+    def by_method(self):
+        return Counter(query.method for query in self.queries)
+
+    def repeated(self, threshold):
+        """(fingerprint, count, methods) for statements run at least threshold times"""
+        counts = Counter()
+        methods = {}
+        for query in self.queries:
+            key = fingerprint(query.statement)
+            counts[key] += 1
+            methods.setdefault(key, set()).add(query.method)
+        return [(key, count, sorted(methods[key])) for key, count in counts.most_common()
+                if count >= threshold]
+
+    def slow(self):
+        return [query for query in self.queries if query.seconds >= self.slow_seconds]
+
+    def describe(self):
+        """One line per statement, for assertion messages"""
+        return '\n'.join(f"  {query.seconds * 1000:7.2f} ms  {query.method:<28} {fingerprint(query.statement)[:160]}"
+                         for query in self.queries)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More statements ran than a max_queries() block allows"""
+
+
+def active():
+    return _current.get()
+
+
+def start(label='', slow_seconds=0.25):
+    """Begin profiling the current request"""
+    profile = QueryProfile(label, slow_seconds)
+    _current.set(profile)
+    return profile
+
+
+def stop():
+    _current.set(None)
+
+
+def record(statement, params, seconds, method, many=False):
+    """Add a statement to the active profile; a no-op (one lookup) when none is active"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(statement, params, seconds, method, many)
+
+
+def report(profile, budget, repeat_threshold, explain=None):
+    """Log budget overruns, likely N+1 patterns and slow statements (with EXPLAIN) for a profile"""
+    if profile.count > budget:
+        logger.warning("%s ran %s SQL statements (budget %s)", profile.label, profile.count, budget,
+                       extra={'sql_by_method': dict(profile.by_method())})
+    for statement, count, methods in profile.repeated(repeat_threshold):
+        logger.warning("Possible N+1 in %s: the same statement ran %s times", profile.label, count,
+                       extra={'statement': statement, 'methods': methods})
+    for query in profile.slow():
+        key = fingerprint(query.statement)
+        plan = None
+        # Each statement is explained once per process; plans rarely change between requests
+        # executemany statements have no single parameter set to EXPLAIN with
+        explainable = query.params is not None or query.params_shape is None
+        if (explain is not None and explainable and key not in _explained
+                and len(_explained) < MAX_EXPLAINED and _EXPLAINABLE.match(key)):
+            _explained.add(key)
+            try:
+                plan = explain(query.statement, query.params)
+            except Exception as e:
+                plan = f'EXPLAIN failed: {e}'
+        logger.warning("Slow SQL (%.0f ms) in %s from %s", query.seconds * 1000, profile.label, query.method,
+                       extra={'statement': key, 'params': query.params_shape, 'plan': plan})
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("SQL profile for %s: %s statements in %.1f ms", profile.label, profile.count,
+                     profile.total_seconds * 1000, extra={'queries': [query.to_dict() for query in profile.queries]})
+
+
+@contextmanager
+def max_queries(limit, label='block'):
+    """Fail with QueryBudgetExceeded if the block runs more than limit statements"""
+    token = _current.set(QueryProfile(label))
+    profile = _current.get()
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+    if profile.count > limit:
+        raise QueryBudgetExceeded(f"{label} ran {profile.count} SQL statements, budget {limit}:\n"
+                                  f"{profile.describe()}")
+
+
+def assert_max_queries(client, path, limit, method='GET', **kwargs):
+    """Request path with a Flask test client and fail if it ran more than limit statements"""
+    with max_queries(limit, label=f'{method} {path}'):
+        return client.open(path, method=method, **kwargs)
@@ -0,0 +1,217 @@
+"""
+Token-bucket rate limiting with pluggable storage
+
+Each key owns a bucket of `limit` tokens that refills continuously over
+`window` seconds; a request spends one token. A bucket is one small
+record updated in O(1), and buckets that have been idle long enough to
+refill completely are simply forgotten (lazy expiry), since a missing
+bucket and a full one behave the same.
+
+Backends:
+    memory://                 per-process dict (tests, single worker)
+    sqlite:///path/to/file    shared by every worker process on the host
+    redis://host:port/db      any Redis-compatible server (needs the redis package)
+"""
+import os
+import sqlite3
+import threading
+import time
+
+
+class RateLimitResult:
+    """Outcome of one rate-limit check"""
+
+    def __init__(self, allowed, remaining, retry_after):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after = retry_after  # seconds until a token is available (0 if allowed)
+
+
+def _refill(tokens, updated_at, now, limit, window):
+    """Spend one token from a bucket; returns (result, new_tokens)"""
+    rate = limit / window
+    tokens = min(limit, tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        tokens -= 1
+        return RateLimitResult(True, int(tokens), 0), tokens
+    return RateLimitResult(False, 0, (1 - tokens) / rate), tokens
+
+
+class MemoryBackend:
+    """Buckets in a per-process dict; limits are not shared between workers"""
+
+    SWEEP_BATCH = 2
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at, expires_at), oldest update first
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None or bucket[2] <= now:
+                tokens, updated_at = limit, now
+            else:
+                tokens, updated_at = bucket[0], bucket[1]
+            result, tokens = _refill(tokens, updated_at, now, limit, window)
+            # Re-inserting keeps the dict ordered by last update, so the
+            # stalest buckets sit at the front for the sweep below
+            self._buckets[key] = (tokens, now, now + window * (limit - tokens) / limit)
+            self._sweep(now)
+            return result
+
+    def _sweep(self, now):
+        """Drop a few expired buckets from the front; amortised O(1) per hit"""
+        for _ in range(self.SWEEP_BATCH):
+            oldest = next(iter(self._buckets), None)
+            if oldest is None:
+                return
+            expired = self._buckets[oldest][2] <= now
+            if not expired and len(self._buckets) <= self.max_keys:
+                return
+            del self._buckets[oldest]
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by every worker process on the host"""
+
+    SWEEP_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._hits = 0
+        self._counter_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                bucket_key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_rate_limit_expires ON rate_limit_buckets (expires_at)")
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        connection = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers
+        # cannot both read the same token count
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT tokens, updated_at, expires_at FROM rate_limit_buckets WHERE bucket_key = ?", (key,)
+            ).fetchone()
+            if row is None or row[2] <= now:
+                tokens, updated_at = limit, now
+            else:
+                tokens, updated_at = row[0], row[1]
+            result, tokens = _refill(tokens, updated_at, now, limit, window)
+            connection.execute("""
+                INSERT OR REPLACE INTO rate_limit_buckets (bucket_key, tokens, updated_at, expires_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, tokens, now, now + window * (limit - tokens) / limit))
+            if self._should_sweep():
+                connection.execute("DELETE FROM rate_limit_buckets WHERE expires_at <= ?", (now,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    def reset(self, key=None):
+        connection = self._connection()
+        if key is None:
+            connection.execute("DELETE FROM rate_limit_buckets")
+        else:
+            connection.execute("DELETE FROM rate_limit_buckets WHERE bucket_key = ?", (key,))
+
+    def _should_sweep(self):
+        with self._counter_lock:
+            self._hits += 1
+            return self._hits % self.SWEEP_EVERY == 0
+
+    def _connection(self):
+        """One autocommit SQLite connection per thread (and per process after a fork)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+class RedisBackend:
+    """Buckets in a Redis-compatible server, updated atomically by a Lua script"""
+
+    # KEYS[1] bucket; ARGV limit, window, now. Returns {allowed, tokens*1000}
+    SCRIPT = """
+        local limit = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local rate = limit / window
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local tokens = tonumber(state[1])
+        local updated_at = tonumber(state[2])
+        if tokens == nil then
+            tokens = limit
+            updated_at = now
+        end
+        tokens = math.min(limit, tokens + (now - updated_at) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+        redis.call('PEXPIRE', KEYS[1], math.ceil(window * (limit - tokens) / limit * 1000) + 1)
+        return {allowed, math.floor(tokens * 1000)}
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis  # pyright: ignore[reportMissingImports]
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        allowed, tokens = self._script(keys=[self.prefix + key], args=[limit, window, now])
+        tokens = tokens / 1000
+        if allowed:
+            return RateLimitResult(True, int(tokens), 0)
+        return RateLimitResult(False, 0, (1 - tokens) * window / limit)
+
+    def reset(self, key=None):
+        if key is not None:
+            self._client.delete(self.prefix + key)
+            return
+        for bucket in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(bucket)
+
+
+def create_backend(url):
+    """Build a backend from a storage URL (memory://, sqlite:///path, redis://...)"""
+    if url.startswith('memory://'):
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported rate limit storage URL: {url}")
@@ -67,7 +67,7 @@ MIN_FLASHCARDS_PER_GENERATION=1
 def check_dependencies():
     """Check if all required packages are installed"""
     required_packages = [
-        'flask', 'authlib', 'flask_mail', 'requests', 
+        'flask', 'authlib', 'requests', 
         'pymysql', 'dotenv', 'intasend'
     ]
     
@@ -0,0 +1,47 @@
+"""
+Spaced-repetition scheduling (SM-2) for EduVerse flashcards
+"""
+from datetime import timedelta
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_DELAY = timedelta(minutes=10)
+
+# Study page answers mapped onto SM-2 quality grades (0-5)
+GRADE_CORRECT = 4
+GRADE_INCORRECT = 1
+RESULT_GRADES = {'correct': GRADE_CORRECT, 'incorrect': GRADE_INCORRECT}
+
+
+def schedule_review(ease, interval_days, repetitions, grade, now):
+    """Apply one SM-2 review and return the card's new scheduling state
+
+    grade is 0-5; anything below 3 is a lapse, which resets the repetition
+    count and brings the card back after RELEARN_DELAY.
+    """
+    grade = max(0, min(5, int(grade)))
+    ease = ease or DEFAULT_EASE
+    interval_days = interval_days or 0
+    repetitions = repetitions or 0
+
+    if grade < 3:
+        repetitions = 0
+        interval_days = 0
+        due_at = now + RELEARN_DELAY
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval_days = 1
+        elif repetitions == 2:
+            interval_days = 6
+        else:
+            interval_days = max(1, round(interval_days * ease))
+        due_at = now + timedelta(days=interval_days)
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return {
+        'ease_factor': round(ease, 4),
+        'interval_days': interval_days,
+        'repetitions': repetitions,
+        'due_at': due_at,
+    }
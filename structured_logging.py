@@ -0,0 +1,214 @@
+"""
+Structured, non-blocking logging
+
+configure_logging() routes every logger through one handler that never
+blocks the caller: the calling thread only resolves the message and puts
+the record on a bounded queue, and a listener thread does the JSON
+encoding and the write to stdout. When the queue is full the record is
+dropped and counted instead of making a request wait on the log pipe.
+
+Each record carries the ID of the request that produced it, and repeated
+messages are sampled: within each second the first `initial` records of a
+message template are kept, then every `thereafter`-th, and the next kept
+record reports how many were suppressed.
+"""
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_handler = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, request_id and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if getattr(record, 'request_id', None) is None:
+            record.request_id = '-'
+        return super().format(record)
+
+
+class ContextFilter(logging.Filter):
+    """Stamp the current request ID on the record while still on the caller's thread"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep the first `initial` records per message template per tick, then every `thereafter`-th"""
+
+    def __init__(self, initial=100, thereafter=100, tick=1.0):
+        super().__init__()
+        self.initial = initial
+        self.thereafter = thereafter
+        self.tick = tick
+        self.suppressed_total = 0
+        self._counts = {}
+        self._suppressed = {}
+        self._tick_started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.initial <= 0:
+            return True
+        # The unformatted template, so "Error saving %s" counts as one message
+        key = (record.name, record.levelno, record.msg if isinstance(record.msg, str) else repr(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            if now - self._tick_started >= self.tick:
+                self._counts.clear()
+                self._tick_started = now
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+            over = count - self.initial
+            if over > 0 and (self.thereafter <= 0 or over % self.thereafter):
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                self.suppressed_total += 1
+                return False
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class AsyncHandler(QueueHandler):
+    """Hands records to a listener thread that writes them with `target`; never blocks"""
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, where the arguments are still
+        # valid; JSON encoding is left to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._closed:
+            # Late records at interpreter exit are written directly
+            self.target.handle(record)
+            return
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # The listener thread does not survive fork(), and the parent's queue
+            # may hold its records, so a forked worker starts over with its own
+            self.queue = queue.Queue(self.maxsize)
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def stats(self):
+        return {'queued': self.queue.qsize(), 'dropped': self.dropped}
+
+    def close(self):
+        """Write out everything still queued, then stop the listener"""
+        with self._lock:
+            listener = self._listener if self._pid == os.getpid() else None
+            self._listener = None
+            self._pid = None
+            self._closed = True
+        if listener is not None:
+            listener.stop()
+        self.target.flush()
+        super().close()
+
+
+def parse_levels(spec):
+    """'mail_queue=DEBUG,rate_limiter=WARNING' -> [('mail_queue', 'DEBUG'), ('rate_limiter', 'WARNING')]"""
+    levels = []
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels.append((name.strip(), level.strip().upper()))
+    return levels
+
+
+def configure_logging(level='INFO', levels='', fmt='json', queue_size=10000,
+                      sample_initial=100, sample_thereafter=100):
+    """Install the non-blocking handler on the root logger and apply per-module levels"""
+    global _handler
+    target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JSONFormatter() if fmt == 'json' else TextFormatter())
+    handler = AsyncHandler(target, queue_size)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(sample_initial, sample_thereafter))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _handler.close()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(levels):
+        logging.getLogger(name).setLevel(module_level)
+    _handler = handler
+    return handler
+
+
+def logging_stats():
+    """Queue depth, dropped records and suppressed (sampled-out) records for this process"""
+    if _handler is None:
+        return {'queued': 0, 'dropped': 0, 'suppressed': 0}
+    stats = _handler.stats()
+    stats['suppressed'] = sum(f.suppressed_total for f in _handler.filters if isinstance(f, SamplingFilter))
+    return stats
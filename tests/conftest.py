@@ -0,0 +1,261 @@
+"""
+Shared fixtures: the app is imported with every on-disk store pointed at a
+temporary directory, and with no OAuth, payment or database credentials.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db_pool import ConnectionPool  # noqa: E402
+
+_TMP = tempfile.mkdtemp(prefix='eduverse-tests-')
+os.environ.update({
+    'SECRET_KEY': 'test-secret',
+    'LOG_LEVEL': 'WARNING',
+    'LOG_FORMAT': 'text',
+    'METRICS_DIR': os.path.join(_TMP, 'metrics'),
+    'PROFILE_DIR': os.path.join(_TMP, 'profiles'),
+    'MAIL_QUEUE_PATH': os.path.join(_TMP, 'mail_queue.sqlite3'),
+    'FLASHCARD_CACHE_PATH': os.path.join(_TMP, 'flashcard_cache.sqlite3'),
+    'RATE_LIMIT_STORAGE_URL': 'memory://',
+})
+for name in ('GOOGLE_CLIENT_ID', 'GOOGLE_CLIENT_SECRET', 'GITHUB_CLIENT_ID', 'GITHUB_CLIENT_SECRET',
+             'INTASEND_PUBLISHABLE_KEY', 'INTASEND_SECRET_KEY', 'PROFILER_TOKEN', 'METRICS_TOKEN'):
+    os.environ[name] = ''
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    app.app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+# SQLite stand-in for the production database. It speaks enough of the
+# PostgreSQL dialect (RETURNING, ON CONFLICT, SUBSTRING) for EduVerse's
+# queries, and is served through the real ConnectionPool so every statement
+# reaches record_query() and the SQL profiler.
+SCHEMA = """
+CREATE TABLE users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    email_verified BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE flashcards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    topic VARCHAR(255),
+    difficulty VARCHAR(10) DEFAULT 'medium',
+    question_type VARCHAR(50) DEFAULT 'short_answer',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_reviewed TIMESTAMP NULL,
+    review_count INT DEFAULT 0,
+    due_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ease_factor REAL DEFAULT 2.5,
+    interval_days INT DEFAULT 0,
+    repetitions INT DEFAULT 0,
+    question_signature VARCHAR(512) NULL,
+    insert_batch CHAR(32) NULL
+);
+CREATE TABLE review_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT,
+    flashcard_id INT NOT NULL,
+    session_id INT NULL,
+    grade SMALLINT NOT NULL,
+    response_ms INT NULL,
+    reviewed_at TIMESTAMP NOT NULL
+);
+CREATE TABLE flashcard_lsh (
+    user_id INT NOT NULL,
+    band_hash BIGINT NOT NULL,
+    flashcard_id INT NOT NULL,
+    PRIMARY KEY (user_id, band_hash, flashcard_id)
+);
+CREATE TABLE study_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT,
+    topic VARCHAR(255),
+    session_date DATE,
+    cards_studied INT DEFAULT 0,
+    correct_answers INT DEFAULT 0,
+    total_time_minutes INT DEFAULT 0
+);
+CREATE TABLE subscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT UNIQUE,
+    subscription_type VARCHAR(10) DEFAULT 'trial',
+    status VARCHAR(10) DEFAULT 'active',
+    trial_start_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    trial_end_date TIMESTAMP,
+    subscription_start_date TIMESTAMP NULL,
+    subscription_end_date TIMESTAMP NULL,
+    intasend_payment_id VARCHAR(255) NULL,
+    amount_paid DECIMAL(10,2) DEFAULT 0.00
+);
+CREATE TABLE user_stats_rollup (
+    user_id INT PRIMARY KEY,
+    total_sessions INT NOT NULL DEFAULT 0,
+    total_cards INT NOT NULL DEFAULT 0,
+    total_correct INT NOT NULL DEFAULT 0,
+    total_time_minutes INT NOT NULL DEFAULT 0
+);
+CREATE TABLE user_topic_daily_stats (
+    user_id INT NOT NULL,
+    topic VARCHAR(255) NOT NULL DEFAULT '',
+    stat_date DATE NOT NULL,
+    sessions INT NOT NULL DEFAULT 0,
+    cards_studied INT NOT NULL DEFAULT 0,
+    correct_answers INT NOT NULL DEFAULT 0,
+    time_minutes INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, topic, stat_date)
+);
+"""
+
+
+class SQLiteCursor:
+    def __init__(self, connection):
+        self._cursor = connection.cursor()
+
+    @staticmethod
+    def _translate(query):
+        # SQLite has no row locks (writers are serialized), so FOR UPDATE is dropped
+        return query.replace('%s', '?').replace('INSERT IGNORE', 'INSERT OR IGNORE').replace('FOR UPDATE', '')
+
+    def execute(self, query, params=None):
+        self._cursor.execute(self._translate(query), tuple(params or ()))
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(self._translate(query), [tuple(params) for params in seq_of_params])
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Just enough of the PyMySQL/psycopg2 connection interface"""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                           check_same_thread=False, isolation_level=None)
+
+    def cursor(self):
+        return SQLiteCursor(self._connection)
+
+    def begin(self):
+        if not self._connection.in_transaction:
+            self._connection.execute('BEGIN')
+
+    def commit(self):
+        if self._connection.in_transaction:
+            self._connection.execute('COMMIT')
+
+    def rollback(self):
+        if self._connection.in_transaction:
+            self._connection.execute('ROLLBACK')
+
+    def close(self):
+        self._connection.close()
+
+
+def execute_values(cursor, sql, rows, page_size=100, fetch=False):
+    """psycopg2.extras.execute_values for the SQLite cursor"""
+    rows = list(rows)
+    placeholders = '(' + ', '.join(['%s'] * len(rows[0])) + ')'
+    cursor.execute(sql.replace('VALUES %s', 'VALUES ' + ', '.join([placeholders] * len(rows))),
+                   [value for row in rows for value in row])
+    return cursor.fetchall() if fetch else None
+
+
+class Database:
+    """Direct access to the test database, for arranging and checking rows"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def execute(self, query, params=()):
+        connection = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES)
+        try:
+            with connection:
+                rows = connection.execute(query, params).fetchall()
+            return rows
+        finally:
+            connection.close()
+
+    def add_user(self, username='learner', trial_days=7):
+        self.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, 'x')",
+                     (username, f'{username}@example.com'))
+        user_id = self.execute("SELECT id FROM users WHERE username = ?", (username,))[0][0]
+        self.execute("INSERT INTO subscriptions (user_id, subscription_type, status, trial_end_date) "
+                     "VALUES (?, 'trial', 'active', ?)", (user_id, datetime.now() + timedelta(days=trial_days)))
+        return user_id
+
+
+def _make_db(app_module, monkeypatch, tmp_path, db_type):
+    path = str(tmp_path / 'eduverse.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    columns = frozenset(row[1] for row in connection.execute("PRAGMA table_info(flashcards)"))
+    connection.close()
+
+    pool = ConnectionPool(lambda: SQLiteConnection(path), min_size=0, max_size=5,
+                          on_query=app_module.record_query)
+    monkeypatch.setattr(app_module, 'DB_TYPE', db_type)
+    monkeypatch.setattr(app_module, 'db_pool', pool)
+    monkeypatch.setattr(app_module, 'execute_values', execute_values)
+    for key in ('host', 'database', 'user', 'password'):
+        monkeypatch.setitem(app_module.DB_CONFIG, key, 'test')
+    monkeypatch.setattr(app_module.eduverse, '_db_available', True)
+    # Stands in for the information_schema / DESCRIBE lookup, which SQLite lacks
+    monkeypatch.setattr(app_module.eduverse, '_flashcard_columns', columns)
+    monkeypatch.setattr(app_module, 'subscription_cache', type(app_module.subscription_cache)())
+    return pool, Database(path)
+
+
+@pytest.fixture
+def db(app_module, monkeypatch, tmp_path):
+    pool, database = _make_db(app_module, monkeypatch, tmp_path, 'postgresql')
+    yield database
+    pool.closeall()
+
+
+@pytest.fixture
+def mysql_db(app_module, monkeypatch, tmp_path):
+    """The same database with EduVerse taking its MySQL code paths"""
+    pool, database = _make_db(app_module, monkeypatch, tmp_path, 'mysql')
+    yield database
+    pool.closeall()
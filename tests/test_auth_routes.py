@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.fixture
+def fresh_oauth(app_module, monkeypatch):
+    """Rebuild the lazily created OAuth registry from the patched credentials"""
+    monkeypatch.setattr(app_module, '_oauth', None)
+    yield
+    app_module._oauth = None
+
+
+@pytest.mark.parametrize('provider', ['google', 'github'])
+def test_unconfigured_provider_redirects_to_login(client, fresh_oauth, provider):
+    response = client.get(f'/auth/{provider}')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
+
+
+def test_configured_github_redirects_to_authorize_url(app_module, client, fresh_oauth, monkeypatch):
+    monkeypatch.setattr(app_module, 'GITHUB_CLIENT_ID', 'client-id')
+    monkeypatch.setattr(app_module, 'GITHUB_CLIENT_SECRET', 'client-secret')
+    response = client.get('/auth/github')
+    assert response.status_code == 302
+    assert response.headers['Location'].startswith('https://github.com/login/oauth/authorize')
+    assert 'client_id=client-id' in response.headers['Location']
@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_app_imports_without_the_postgres_driver():
+    # A MySQL deployment does not need psycopg2 installed; it is imported on first PostgreSQL use
+    code = ("import sys; sys.modules['psycopg2'] = None; sys.modules['psycopg2.extras'] = None; "
+            "import app; print(app.DB_TYPE)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, DB_TYPE='mysql'), timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('mysql')
@@ -0,0 +1,187 @@
+import gc
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if self.connection.broken:
+            raise OSError('server closed the connection')
+        self.connection.statements.append(query)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Stands in for a DB-API connection, with psycopg2's transaction status when given one"""
+
+    def __init__(self, status=None):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+        self.statements = []
+        if status is not None:
+            self.get_transaction_status = lambda: status
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class Factory:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.made = []
+
+    def __call__(self):
+        connection = FakeConnection(**self.kwargs)
+        self.made.append(connection)
+        return connection
+
+
+def test_checkout_reuses_the_returned_connection():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=2)
+    first = pool.getconn()
+    raw = first.raw
+    assert pool.stats()['in_use'] == 1
+    first.close()
+    first.close()  # a second close is a no-op
+    assert pool.stats() == {'size': 1, 'idle': 1, 'in_use': 0, 'min_size': 0, 'max_size': 2}
+    assert pool.getconn().raw is raw
+    assert len(factory.made) == 1
+
+
+def test_warm_opens_min_size():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=3, max_size=5)
+    pool.warm()
+    assert pool.stats()['idle'] == 3
+    assert len(factory.made) == 3
+
+
+def test_full_pool_times_out():
+    pool = ConnectionPool(Factory(), min_size=0, max_size=1, timeout=0.05)
+    held = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    held.close()
+
+
+def test_waiting_checkout_gets_the_next_returned_connection():
+    pool = ConnectionPool(Factory(), min_size=0, max_size=1, timeout=5)
+    held = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.05)
+    held.close()
+    waiter.join(2)
+    assert got and got[0].raw is held.raw
+
+
+def test_idle_connections_are_evicted_down_to_min_size():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=1, max_size=5, max_idle=10)
+    connections = [pool.getconn() for _ in range(3)]
+    for connection in connections:
+        connection.close()
+    # Age the idle connections past max_idle
+    pool._idle = type(pool._idle)((raw, used - 60) for raw, used in pool._idle)
+
+    connection = pool.getconn()
+    assert pool.stats()['size'] == 1
+    assert sum(raw.closed for raw in factory.made) == 2
+    assert not connection.raw.closed
+
+
+def test_closed_idle_connection_is_replaced():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=2)
+    connection = pool.getconn()
+    connection.close()
+    factory.made[0].closed = 1
+
+    connection = pool.getconn()
+    assert connection.raw is factory.made[1]
+    assert pool.stats()['size'] == 1
+
+
+def test_long_idle_connection_is_checked_with_a_round_trip():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=2, health_check_interval=0)
+    pool.getconn().close()
+    assert pool.getconn().raw is factory.made[0]
+    assert factory.made[0].statements == ['SELECT 1']
+
+    pool = ConnectionPool(factory, min_size=0, max_size=2, health_check_interval=0)
+    pool.getconn().close()
+    factory.made[-1].broken = True
+    assert pool.getconn().raw is factory.made[-1]
+    assert factory.made[-2].closed
+
+
+@pytest.mark.parametrize('status, rollbacks, pooled', [(0, 0, True), (2, 1, True), (3, 1, True), (4, 0, False)])
+def test_returned_connection_is_reset(status, rollbacks, pooled):
+    factory = Factory(status=status)
+    pool = ConnectionPool(factory, min_size=0, max_size=2)
+    pool.getconn().close()
+    raw = factory.made[0]
+    assert raw.rollbacks == rollbacks
+    assert pool.stats()['idle'] == (1 if pooled else 0)
+    assert raw.closed == (0 if pooled else 1)
+
+
+def test_leaked_connection_frees_its_slot():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=1, timeout=0.05)
+    pool.getconn()  # dropped without close()
+    gc.collect()
+    assert pool.stats()['size'] == 0
+    assert factory.made[0].closed
+    pool.getconn()
+
+
+def test_cursors_report_their_statements():
+    seen = []
+    pool = ConnectionPool(Factory(), min_size=0, max_size=1,
+                          on_query=lambda query, params, seconds, many=False: seen.append((query, params, many)))
+    connection = pool.getconn()
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1", (1,))
+    connection.raw.broken = True
+    with pytest.raises(OSError):
+        cursor.execute("SELECT 2")
+    assert seen == [("SELECT 1", (1,), False), ("SELECT 2", None, False)]
+
+
+def test_closeall_closes_idle_and_refuses_returns():
+    factory = Factory()
+    pool = ConnectionPool(factory, min_size=0, max_size=2)
+    held = pool.getconn()
+    pool.getconn().close()
+    pool.closeall()
+    held.close()
+    assert all(raw.closed for raw in factory.made)
+    assert pool.stats()['size'] == 0
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
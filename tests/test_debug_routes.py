@@ -0,0 +1,16 @@
+def login(client, user_id=1):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'learner'
+
+
+def test_explain_is_hidden_without_a_profiler_token(client):
+    login(client)
+    assert client.get('/debug/explain').status_code == 404
+
+
+def test_explain_needs_the_profiler_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PROFILER_TOKEN', 'operator-token')
+    login(client)
+    assert client.get('/debug/explain').status_code == 401
+    assert client.get('/debug/explain', headers={'X-Profiler-Token': 'wrong'}).status_code == 401
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from jobs import JobQueue
+
+from near_duplicates import band_hashes, minhash, encode_signature
+
+ORIGINAL = 'What organelle produces most of the ATP in a eukaryotic cell?'
+EDITED = 'Which enzyme unwinds the DNA double helix during replication?'
+
+
+@pytest.fixture(params=['postgresql', 'mysql'])
+def any_db(request):
+    return request.getfixturevalue('db' if request.param == 'postgresql' else 'mysql_db')
+
+
+def save(app_module, user_id, question, topic='biology'):
+    return app_module.eduverse.save_flashcards(user_id, [{'question': question, 'answer': 'a'}], topic)['flashcard_ids']
+
+
+def test_repeated_question_returns_the_saved_card(app_module, any_db):
+    user_id = any_db.add_user()
+    [card_id] = save(app_module, user_id, ORIGINAL)
+
+    assert save(app_module, user_id, ORIGINAL.lower().rstrip('?')) == [card_id]
+    assert any_db.execute("SELECT COUNT(*) FROM flashcards") == [(1,)]
+
+
+def test_duplicates_within_one_batch_are_saved_once(app_module, db):
+    user_id = db.add_user()
+    ids = app_module.eduverse.save_flashcards(user_id, [
+        {'question': ORIGINAL, 'answer': 'mitochondria'},
+        {'question': EDITED, 'answer': 'helicase'},
+        {'question': ORIGINAL, 'answer': 'mitochondria, again'},
+    ], 'biology')['flashcard_ids']
+
+    assert ids[0] == ids[2] != ids[1]
+    assert db.execute("SELECT COUNT(*) FROM flashcards") == [(2,)]
+
+
+def test_other_users_cards_are_not_matched(app_module, db):
+    [card_id] = save(app_module, db.add_user('owner'), ORIGINAL)
+    assert save(app_module, db.add_user('other'), ORIGINAL) != [card_id]
+
+
+def test_editing_a_question_reindexes_it(app_module, any_db):
+    user_id = any_db.add_user()
+    [card_id] = save(app_module, user_id, ORIGINAL)
+
+    assert app_module.eduverse.update_flashcard(card_id, user_id, EDITED, 'helicase', 'biology',
+                                                'medium', 'short_answer')
+
+    signature = minhash(EDITED)
+    assert any_db.execute("SELECT question_signature FROM flashcards WHERE id = ?",
+                          (card_id,)) == [(encode_signature(signature),)]
+    assert {row[0] for row in any_db.execute("SELECT band_hash FROM flashcard_lsh WHERE flashcard_id = ?",
+                                             (card_id,))} == set(band_hashes(signature))
+    # The old text no longer matches the card; the new text does
+    assert save(app_module, user_id, ORIGINAL) != [card_id]
+    assert save(app_module, user_id, EDITED) == [card_id]
+
+
+def test_editing_another_users_card_leaves_the_index_alone(app_module, db):
+    owner = db.add_user('owner')
+    other = db.add_user('other')
+    [card_id] = save(app_module, owner, ORIGINAL)
+    before = db.execute("SELECT band_hash FROM flashcard_lsh WHERE flashcard_id = ? ORDER BY band_hash", (card_id,))
+
+    app_module.eduverse.update_flashcard(card_id, other, EDITED, 'x', 'biology', 'medium', 'short_answer')
+
+    assert db.execute("SELECT question FROM flashcards WHERE id = ?", (card_id,)) == [(ORIGINAL,)]
+    assert db.execute("SELECT band_hash FROM flashcard_lsh WHERE flashcard_id = ? ORDER BY band_hash",
+                      (card_id,)) == before
+
+
+def test_save_reports_saved_and_skipped_counts(app_module, db):
+    user_id = db.add_user()
+    [existing_id] = save(app_module, user_id, ORIGINAL)
+
+    result = app_module.eduverse.save_flashcards(user_id, [
+        {'question': ORIGINAL, 'answer': 'mitochondria'},
+        {'question': EDITED, 'answer': 'helicase'},
+        {'question': EDITED, 'answer': 'helicase, again'},
+    ], 'biology')
+
+    assert result['saved'] == 1
+    assert result['skipped'] == 2
+    new_id = result['flashcard_ids'][1]
+    assert result['flashcard_ids'] == [existing_id, new_id, new_id]
+
+
+def test_duplicates_are_only_matched_within_the_topic(app_module, db):
+    user_id = db.add_user()
+    [biology_id] = save(app_module, user_id, ORIGINAL, topic='biology')
+
+    result = app_module.eduverse.save_flashcards(user_id, [{'question': ORIGINAL, 'answer': 'a'}], 'exam prep')
+
+    assert result['saved'] == 1
+    assert result['flashcard_ids'] != [biology_id]
+    assert db.execute("SELECT COUNT(*) FROM flashcards WHERE topic = 'exam prep'") == [(1,)]
+
+
+def test_generation_status_reports_skipped_cards(app_module, db, client, monkeypatch):
+    user_id = db.add_user()
+    save(app_module, user_id, ORIGINAL)
+    monkeypatch.setattr(app_module.eduverse, 'generate_flashcards',
+                        lambda notes, num_cards: [{'question': ORIGINAL, 'answer': 'a'}])
+    monkeypatch.setattr(app_module, 'generation_jobs', JobQueue(max_workers=1))
+    job_id = app_module.generation_jobs.submit('generate_flashcards', user_id, app_module.run_generation_job,
+                                               user_id, 'notes', 'biology', 1)
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'learner'
+
+    deadline = time.monotonic() + 5
+    while True:
+        status = client.get(f'/generate_flashcards/status/{job_id}').get_json()
+        if status['status'] == 'done' or time.monotonic() > deadline:
+            break
+        time.sleep(0.01)
+
+    assert status['result'] == {'count': 0, 'saved': 0, 'skipped': 1, 'topic': 'biology'}
+    # Polling again before following redirect_url does not repeat the message
+    client.get(f'/generate_flashcards/status/{job_id}')
+    with client.session_transaction() as session:
+        assert [message for _, message in session['_flashes']] == [
+            'Saved 0 new flashcards; 1 matched cards already in "biology" and were not duplicated.']
+    # The skipped card is in the topic, so the study page has something to show
+    study = client.get(status['redirect_url'])
+    assert study.status_code == 200
+    assert ORIGINAL.encode() in study.data
+
+
+def test_paraphrase_of_a_saved_card_is_skipped(app_module, db):
+    user_id = db.add_user()
+    [card_id] = save(app_module, user_id, 'What is the function of mitochondria?')
+
+    assert save(app_module, user_id, 'What is the function of the mitochondria?') == [card_id]
+    assert save(app_module, user_id, 'What is the function of ribosomes?') != [card_id]
@@ -0,0 +1,34 @@
+import os
+import runpy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_config(monkeypatch, **env):
+    for name in ('WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GENERATION_WORKERS', 'DB_POOL_MAX_SIZE',
+                 'DB_CONNECTION_BUDGET'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: set(range(16)), raising=False)
+    return runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+
+
+def test_default_workers_fit_the_connection_budget(monkeypatch):
+    config = load_config(monkeypatch, DB_CONNECTION_BUDGET='80')
+    # 4 threads + 4 generation workers + the flusher per worker; 33 workers would need 297
+    assert config['db_pool_max_size'] == 9
+    assert config['workers'] == 8
+    assert os.environ['DB_POOL_MAX_SIZE'] == '9'
+
+
+def test_explicit_worker_count_shrinks_the_pools(monkeypatch):
+    config = load_config(monkeypatch, WEB_CONCURRENCY='20', DB_CONNECTION_BUDGET='80')
+    assert config['workers'] == 20
+    assert os.environ['DB_POOL_MAX_SIZE'] == '4'
+
+
+def test_explicit_pool_size_is_kept(monkeypatch):
+    config = load_config(monkeypatch, DB_POOL_MAX_SIZE='5', DB_CONNECTION_BUDGET='80')
+    assert config['db_pool_max_size'] == 5
+    assert config['workers'] == 16
@@ -0,0 +1,57 @@
+import smtplib
+import sqlite3
+
+import mail_queue
+from mail_queue import MailQueue, SMTPSettings
+
+
+class FakeSMTP:
+    def __init__(self, host, port, timeout=None):
+        self.sent = []
+
+    def starttls(self):
+        pass
+
+    def send_message(self, message):
+        if message['To'] == 'refused@example.com':
+            raise smtplib.SMTPRecipientsRefused({'refused@example.com': (550, b'no such user')})
+        self.sent.append(message)
+
+    def quit(self):
+        pass
+
+
+def outbox(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT recipients, body, status FROM outbox ORDER BY id").fetchall()
+    finally:
+        connection.close()
+
+
+def test_sensitive_bodies_are_blanked_once_sent_or_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(mail_queue.smtplib, 'SMTP', FakeSMTP)
+    path = str(tmp_path / 'outbox.sqlite3')
+    queue = MailQueue(path, SMTPSettings('smtp.example.com'))
+    monkeypatch.setattr(queue, '_ensure_thread', lambda: None)
+
+    queue.enqueue('learner@example.com', 'Verify', 'Your verification code is: 123456', sensitive=True)
+    queue.enqueue('refused@example.com', 'Verify', 'Your verification code is: 654321', sensitive=True)
+    queue.enqueue('learner@example.com', 'Welcome', 'Hello')
+    queue.drain()
+
+    assert outbox(path) == [('["learner@example.com"]', '', 'sent'),
+                            ('["refused@example.com"]', '', 'failed'),
+                            ('["learner@example.com"]', 'Hello', 'sent')]
+
+
+def test_outbox_from_an_earlier_release_gains_the_sensitive_column(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT, "
+                       "recipients TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL, html TEXT, "
+                       "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, "
+                       "claimed_at REAL, last_error TEXT, created_at REAL NOT NULL, sent_at REAL)")
+    connection.close()
+
+    MailQueue(path, SMTPSettings('smtp.example.com'))._connection().execute("SELECT sensitive FROM outbox")
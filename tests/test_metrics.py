@@ -0,0 +1,117 @@
+import json
+import os
+import time
+
+import pytest
+
+from metrics import ARCHIVE_FILE, Registry, _merge, _unmerge
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return Registry(str(tmp_path), flush_interval=60)
+
+
+def write_snapshot(directory, name, snapshot, age=0):
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        json.dump(snapshot, f)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def test_render_counters_and_cumulative_histograms(registry):
+    requests = registry.counter('requests_total', 'Requests', ['route'])
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    requests.inc(route='/a')
+    requests.inc(2, route='/a')
+    requests.inc(route='/b')
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{route="/a"} 3' in lines
+    assert 'requests_total{route="/b"} 1' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_count 3' in lines
+    assert 'latency_seconds_sum 5.55' in lines
+
+
+def test_render_sums_every_workers_snapshot(registry):
+    registry.counter('requests_total', 'Requests', ['route']).inc(route='/a')
+    registry.gauge_from('queue_depth', 'Queued jobs', lambda: {(): 2})
+    write_snapshot(registry.directory, '999-other.json', {
+        'counters': {'requests_total': [[['/a'], 4]]},
+        'histograms': {},
+        'gauges': {'queue_depth': [[[], 3]]},
+    })
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{route="/a"} 5' in lines
+    assert 'queue_depth 5' in lines
+
+
+def test_stale_snapshot_is_archived_without_its_gauges(registry):
+    registry.counter('requests_total', 'Requests', ['route'])
+    registry.gauge_from('queue_depth', 'Queued jobs', lambda: {(): 1})
+    stale = write_snapshot(registry.directory, '998-exited.json', {
+        'counters': {'requests_total': [[['/a'], 7]]},
+        'histograms': {},
+        'gauges': {'queue_depth': [[[], 9]]},
+    }, age=3600)
+
+    lines = registry.render().splitlines()
+    assert not os.path.exists(stale)
+    assert os.path.exists(os.path.join(registry.directory, ARCHIVE_FILE))
+    assert 'requests_total{route="/a"} 7' in lines
+    assert 'queue_depth 1' in lines
+    # Archived totals stay in later scrapes
+    assert 'requests_total{route="/a"} 7' in registry.render().splitlines()
+
+
+def test_merge_adds_values_and_round_trips():
+    merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    snapshot = {'counters': {'c': [[['x'], 1]]}, 'histograms': {'h': [[[], [1, 0, 0.5]]]},
+                'gauges': {'g': [[[], 2]]}}
+    _merge(merged, snapshot)
+    _merge(merged, snapshot, include_gauges=False)
+    assert merged == {'counters': {'c': {('x',): 2}}, 'histograms': {'h': {(): [2, 0, 1.0]}},
+                      'gauges': {'g': {(): 2}}}
+
+    again = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    _merge(again, _unmerge(merged))
+    assert again == merged
+
+
+def test_histogram_with_changed_buckets_replaces_the_old_state():
+    merged = {'counters': {}, 'histograms': {'h': {(): [1, 1, 2.0]}}, 'gauges': {}}
+    _merge(merged, {'histograms': {'h': [[[], [0, 1, 0, 3.0]]]}})
+    assert merged['histograms']['h'][()] == [0, 1, 0, 3.0]
+
+
+def test_reset_deletes_snapshots(registry):
+    registry.counter('requests_total', 'Requests').inc()
+    registry.flush()
+    registry.reset()
+    assert not [name for name in os.listdir(registry.directory) if name.endswith('.json')]
+
+
+def test_duplicate_metric_name_is_rejected(registry):
+    registry.counter('requests_total', 'Requests')
+    with pytest.raises(ValueError):
+        registry.histogram('requests_total', 'Requests')
+
+
+def test_metrics_endpoint_is_off_without_a_token(client):
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_endpoint_needs_the_bearer_token(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'scrape-token')
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-token'})
+    assert response.status_code == 200
+    assert b'eduverse_' in response.data
@@ -0,0 +1,75 @@
+import pytest
+
+from near_duplicates import (DEFAULT_THRESHOLD, SignatureIndex, band_hashes, decode_signature,
+                             encode_signature, jaccard, minhash, shingles, similarity)
+
+PARAPHRASES = [
+    ('What is the function of mitochondria?', 'What is the function of the mitochondria?'),
+    ('What organelle is found in a eukaryotic cell?', 'What organelle is found in eukaryotic cells?'),
+    ('Define photosynthesis.', 'define photosynthesis'),
+    ('What is the powerhouse of the cell?', 'What is known as the powerhouse of the cell?'),
+    ('Explain the role of chlorophyll in photosynthesis.', 'Explain the role chlorophyll plays in photosynthesis.'),
+    ('What is the definition of osmosis?', "What's the definition of osmosis?"),
+    ('What are the main causes of inflation?', 'What are the main causes of price inflation?'),
+]
+
+DIFFERENT = [
+    ('What is the function of mitochondria?', 'What is the function of ribosomes?'),
+    ('What is the capital of France?', 'What is the capital of Spain?'),
+    ('What is the definition of osmosis?', 'What is the definition of diffusion?'),
+    ('Explain the role of chlorophyll in photosynthesis.', 'Explain the role of ATP in cellular respiration.'),
+    ('When did World War I begin?', 'When did World War II end?'),
+    ('What is mitosis?', 'What is meiosis?'),
+    ('How does the Calvin cycle fix carbon dioxide?', 'How does the Krebs cycle release carbon dioxide?'),
+]
+
+
+def index_of(question):
+    index = SignatureIndex()
+    index.add('existing', minhash(question), text=question)
+    return index
+
+
+@pytest.mark.parametrize('existing, new', PARAPHRASES)
+def test_paraphrases_are_found(existing, new):
+    assert index_of(existing).find(minhash(new), text=new) == 'existing'
+
+
+@pytest.mark.parametrize('existing, new', DIFFERENT)
+def test_different_questions_are_not_matched(existing, new):
+    assert index_of(existing).find(minhash(new), text=new) is None
+
+
+@pytest.mark.parametrize('a, b', PARAPHRASES)
+def test_signatures_share_a_band_with_paraphrases(a, b):
+    # Candidates come only from shared bands, so paraphrases must collide in at least one
+    assert set(band_hashes(minhash(a))) & set(band_hashes(minhash(b)))
+
+
+def test_signature_estimate_tracks_exact_similarity():
+    a, b = PARAPHRASES[0]
+    assert abs(similarity(minhash(a), minhash(b)) - jaccard(shingles(a), shingles(b))) < 0.2
+
+
+def test_without_text_the_signature_estimate_decides():
+    index = SignatureIndex()
+    index.add('existing', minhash('What is the function of mitochondria?'))
+    assert index.find(minhash('what is the function of mitochondria')) == 'existing'
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert shingles('Define: Photosynthesis!') == shingles('define photosynthesis')
+    assert shingles('') == set()
+
+
+def test_signature_round_trips_through_its_encoding():
+    signature = minhash('What is ATP?')
+    encoded = encode_signature(signature)
+    assert len(encoded) <= 512  # fits the question_signature column
+    assert decode_signature(encoded) == signature
+
+
+def test_threshold_is_between_the_two_groups():
+    lowest_paraphrase = min(jaccard(shingles(a), shingles(b)) for a, b in PARAPHRASES)
+    highest_different = max(jaccard(shingles(a), shingles(b)) for a, b in DIFFERENT)
+    assert highest_different < DEFAULT_THRESHOLD <= lowest_paraphrase
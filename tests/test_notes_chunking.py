@@ -0,0 +1,129 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from hf_client import InferenceError
+from notes_chunking import allocate_cards, map_chunks, merge_cards, select_chunks, split_notes
+
+
+def card(question, type='short_answer'):
+    return {'question': question, 'answer': 'answer', 'type': type, 'difficulty': 'medium'}
+
+
+def questions(cards):
+    return [c['question'] for c in cards]
+
+
+def test_split_keeps_paragraphs_together_up_to_the_limit():
+    paragraphs = [f'Paragraph {i} ' + 'word ' * 20 for i in range(6)]
+    chunks = split_notes('\n\n'.join(paragraphs), 300)
+    assert all(len(chunk) <= 300 for chunk in chunks)
+    assert '\n\n'.join(chunks).split() == '\n\n'.join(paragraphs).split()
+    assert all(chunk.startswith('Paragraph') for chunk in chunks)
+
+
+def test_split_starts_a_new_chunk_at_a_heading():
+    notes = 'Intro ' * 30 + '\n\nSection 2:\nOsmosis moves water.'
+    chunks = split_notes(notes, 300)
+    assert len(chunks) == 2
+    assert chunks[1].startswith('Section 2:')
+
+
+def test_split_breaks_long_paragraphs_on_sentences_then_words():
+    sentence = 'Cells divide by mitosis in growing tissue. '
+    chunks = split_notes(sentence * 10, 100)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.endswith('.') for chunk in chunks)
+    assert all(len(chunk) <= 50 for chunk in split_notes('x' * 120 + ' ' + 'y' * 10, 50))
+
+
+def test_select_chunks_spreads_over_the_notes():
+    assert select_chunks(list('abcdefghij'), 5) == list('acegi')
+    assert select_chunks(list('abc'), 5) == list('abc')
+
+
+def test_allocate_cards_is_proportional_with_headroom():
+    quotas = allocate_cards(['x' * 300, 'x' * 100], 8)
+    assert quotas == [9, 3]
+    assert allocate_cards(['x' * 1000, 'x'], 4)[1] == 1
+
+
+def test_map_chunks_uses_fallback_for_failed_and_slow_chunks():
+    release = threading.Event()
+
+    def generate(chunk, quota):
+        if chunk == 'fails':
+            raise ValueError('bad response')
+        if chunk == 'slow':
+            release.wait(5)
+        return [card(f'{chunk} {i}') for i in range(quota)]
+
+    def fallback(chunk, quota):
+        return [card(f'fallback {chunk}')]
+
+    with ThreadPoolExecutor(3) as executor:
+        results = map_chunks(executor, 3, ['ok', 'fails', 'slow'], [2, 2, 2], generate, fallback, 0.2)
+        release.set()
+    assert [questions(cards) for cards in results] == [['ok 0', 'ok 1'], ['fallback fails'], ['fallback slow']]
+
+
+def test_merge_drops_near_duplicate_questions():
+    card_lists = [
+        [card('Fill in the blank: _____ converts light energy into chemical energy in chloroplasts', 'fill_blank')],
+        [card('Fill in the blank: Photosynthesis converts _____ energy into chemical energy in chloroplasts',
+              'fill_blank')],
+        [card('What is the function of the mitochondria?')],
+    ]
+    merged = merge_cards(card_lists, 3)
+    assert len(merged) == 2
+    assert questions(merged)[1] == 'What is the function of the mitochondria?'
+
+
+def test_merge_ranks_across_chunks():
+    card_lists = [
+        [card('What is osmosis?'), card('What is diffusion?'), card('What is active transport?'),
+         card('What is a concentration gradient?')],
+        [card('What is mitosis?')],
+    ]
+    # The short chunk's only card is its best and outranks the long chunk's later cards
+    assert questions(merge_cards(card_lists, 2)) == ['What is osmosis?', 'What is mitosis?']
+
+
+def test_merge_prefers_varied_question_types():
+    card_lists = [[card('Fill in the blank: _____ stores genetic material', 'fill_blank'),
+                   card('Fill in the blank: Ribosomes translate _____ into proteins', 'fill_blank'),
+                   card('What is the definition of chromatin?', 'definition')]]
+    assert [c['type'] for c in merge_cards(card_lists, 2)] == ['fill_blank', 'definition']
+
+
+def test_reserve_cards_come_after_chunk_cards():
+    card_lists = [[card('What is osmosis?')]]
+    reserve = [card('What is diffusion?'), card('What is osmosis?')]
+    assert questions(merge_cards(card_lists, 3, reserve=reserve)) == ['What is osmosis?', 'What is diffusion?']
+
+
+def test_merge_skips_cards_without_a_question():
+    assert questions(merge_cards([[card(''), card('?'), card('What is ATP?')]], 3)) == ['What is ATP?']
+
+
+def test_chunked_fallback_cards_are_distinct(app_module, monkeypatch):
+    def unavailable(payload):
+        raise InferenceError('model unavailable')
+
+    monkeypatch.setattr(app_module.hf_client, 'post', unavailable)
+    monkeypatch.setattr(app_module, 'NOTES_CHUNK_CHARS', 600)
+    monkeypatch.setattr(app_module, 'flashcard_cache', None)
+    topics = ['Mitochondria produce ATP through oxidative phosphorylation',
+              'Ribosomes translate messenger RNA into proteins',
+              'Chloroplasts capture light energy for photosynthesis',
+              'The nucleus stores genetic material as chromatin',
+              'Lysosomes digest cellular waste using hydrolytic enzymes',
+              'The Golgi apparatus packages proteins for secretion']
+    notes = '\n\n'.join(f"Section {i + 1}:\nPhotosynthesis converts light energy into chemical energy "
+                        f"in chloroplasts. {topic}." for i, topic in enumerate(topics)) * 2
+    assert len(notes) > app_module.NOTES_CHUNK_CHARS
+
+    cards = app_module.eduverse.generate_flashcards(notes, 10)
+    assert len(cards) == 10
+    assert len({c['question'].lower() for c in cards}) == 10
+    assert not any('Section' in c['question'] for c in cards)
+    assert sum(c['type'] == 'fill_blank' for c in cards) < 5
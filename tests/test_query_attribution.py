@@ -0,0 +1,39 @@
+import query_profiler
+
+
+def test_queries_are_labelled_with_the_eduverse_method(app_module, db):
+    user_id = db.add_user()
+    with query_profiler.max_queries(100) as profile:
+        app_module.eduverse.save_flashcards(user_id, [{'question': 'What is osmosis?', 'answer': 'a'}], 'biology')
+        app_module.eduverse.get_user_flashcards(user_id)
+    methods = profile.by_method()
+    assert methods['save_flashcards'] >= 1
+    assert methods['get_user_flashcards'] >= 1
+    assert set(methods) <= {'save_flashcards', 'get_user_flashcards'}
+
+
+def test_nested_functions_and_properties_map_to_their_method(app_module):
+    class Example:
+        def outer(self):
+            def inner():
+                return [x for x in ()]
+            return inner
+
+        @property
+        def value(self):
+            return 1
+
+    codes = app_module._method_codes(Example)
+    assert codes[Example.outer.__code__] == 'outer'
+    assert codes[Example().outer().__code__] == 'outer'
+    assert codes[Example.value.fget.__code__] == 'value'
+
+
+def test_queries_outside_eduverse_are_other(app_module, db):
+    with query_profiler.max_queries(5) as profile:
+        connection = app_module.get_db_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        connection.close()
+    assert profile.by_method() == {'other': 1}
@@ -0,0 +1,51 @@
+import pytest
+
+import query_profiler
+from query_profiler import QueryBudgetExceeded, assert_max_queries
+
+
+def login(client, user_id, username='learner'):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = username
+
+
+def add_cards(app_module, user_id, count, topic='biology'):
+    cards = [{'question': f'Question number {i} about {topic} and its {i * 7} parts?', 'answer': 'a'}
+             for i in range(count)]
+    assert app_module.eduverse.save_flashcards(user_id, cards, topic) is not False
+
+
+@pytest.mark.parametrize('cards', [0, 30])
+def test_dashboard_runs_one_query(app_module, client, db, cards):
+    user_id = db.add_user()
+    add_cards(app_module, user_id, cards)
+    login(client, user_id)
+
+    response = assert_max_queries(client, '/dashboard', 1)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('cards', [1, 30])
+def test_study_page_query_count_does_not_grow_with_cards(app_module, client, db, cards):
+    user_id = db.add_user()
+    add_cards(app_module, user_id, cards)
+    login(client, user_id)
+
+    # Subscription check, due cards, and the session insert with its two rollups
+    response = assert_max_queries(client, '/study_flashcards/biology', 5)
+    assert response.status_code == 200
+    # The subscription is cached for the next page
+    assert_max_queries(client, '/study_flashcards/biology', 4)
+
+
+def test_budget_failure_lists_the_statements(app_module, client, db):
+    user_id = db.add_user()
+    add_cards(app_module, user_id, 1)
+    login(client, user_id)
+
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        assert_max_queries(client, '/study_flashcards/biology', 1)
+    assert 'get_due_flashcards' in str(excinfo.value)
+    assert 'start_study_session' in str(excinfo.value)
+    assert query_profiler.active() is None
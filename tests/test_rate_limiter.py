@@ -0,0 +1,73 @@
+import pytest
+
+from rate_limiter import MemoryBackend, SQLiteBackend, create_backend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'limits.sqlite3'))
+
+
+def test_limit_then_refill(backend):
+    results = [backend.hit('k', limit=3, window=60, now=1000) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert results[3].retry_after == pytest.approx(20)
+
+    # One token comes back every window / limit seconds
+    assert not backend.hit('k', 3, 60, now=1019).allowed
+    assert backend.hit('k', 3, 60, now=1040).allowed
+
+
+def test_keys_are_independent(backend):
+    backend.hit('a', 1, 60, now=0)
+    assert not backend.hit('a', 1, 60, now=1).allowed
+    assert backend.hit('b', 1, 60, now=1).allowed
+
+
+def test_idle_bucket_is_full_again(backend):
+    for _ in range(3):
+        backend.hit('k', 3, 60, now=0)
+    result = backend.hit('k', 3, 60, now=61)
+    assert result.allowed and result.remaining == 2
+
+
+def test_reset(backend):
+    backend.hit('a', 1, 60, now=0)
+    backend.hit('b', 1, 60, now=0)
+    backend.reset('a')
+    assert backend.hit('a', 1, 60, now=1).allowed
+    assert not backend.hit('b', 1, 60, now=1).allowed
+    backend.reset()
+    assert backend.hit('b', 1, 60, now=1).allowed
+
+
+def test_sqlite_buckets_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'limits.sqlite3')
+    SQLiteBackend(path).hit('k', 1, 60, now=0)
+    assert not SQLiteBackend(path).hit('k', 1, 60, now=1).allowed
+
+
+def test_memory_backend_sweeps_expired_buckets():
+    backend = MemoryBackend()
+    for i in range(10):
+        backend.hit(f'user{i}', 5, 10, now=0)
+    for i in range(10):
+        backend.hit('late', 100, 10, now=100 + i)
+    assert set(backend._buckets) == {'late'}
+
+
+def test_memory_backend_caps_keys():
+    backend = MemoryBackend(max_keys=5)
+    for i in range(20):
+        backend.hit(f'user{i}', 5, 60, now=0)
+    assert list(backend._buckets) == [f'user{i}' for i in range(15, 20)]
+
+
+def test_create_backend(tmp_path):
+    assert isinstance(create_backend('memory://'), MemoryBackend)
+    assert isinstance(create_backend(f'sqlite:///{tmp_path}/limits.sqlite3'), SQLiteBackend)
+    with pytest.raises(ValueError):
+        create_backend('ftp://example.com')
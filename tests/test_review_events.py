@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytest
+
+import query_profiler
+
+
+def event(user_id, card_id, grade=4):
+    return {'user_id': user_id, 'flashcard_id': card_id, 'grade': grade, 'reviewed_at': datetime.now()}
+
+
+def test_cards_are_locked_while_rescheduled(app_module, mysql_db):
+    user_id = mysql_db.add_user()
+    [card_id] = app_module.eduverse.save_flashcards(
+        user_id, [{'question': 'What is osmosis?', 'answer': 'x'}], 'biology')['flashcard_ids']
+
+    with query_profiler.max_queries(3) as profile:
+        app_module.eduverse.save_review_events([event(user_id, card_id), event(user_id, card_id)])
+
+    assert 'FOR UPDATE' in profile.queries[0].statement
+    assert mysql_db.execute("SELECT review_count, repetitions FROM flashcards WHERE id = ?",
+                            (card_id,)) == [(2, 2)]
+    assert len(mysql_db.execute("SELECT id FROM review_log")) == 2
+
+
+def test_unavailable_database_raises_so_the_batch_is_retried(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.eduverse, '_db_available', False)
+    monkeypatch.setattr(app_module.eduverse, '_schema_retry_at', None)
+    with pytest.raises(RuntimeError):
+        app_module.eduverse.save_review_events([event(1, 1)])
@@ -0,0 +1,68 @@
+import pytest
+
+import query_profiler
+
+CARDS = [
+    {'question': 'What is osmosis?', 'answer': 'Water crossing a membrane', 'type': 'definition',
+     'difficulty': 'easy'},
+    {'question': 'What is diffusion?', 'answer': 'Movement down a concentration gradient'},
+    {'question': 'What does active transport use?', 'answer': 'ATP', 'difficulty': 'hard'},
+]
+
+
+def save(app_module, user_id, cards, topic='biology'):
+    return app_module.eduverse.save_flashcards(user_id, cards, topic)['flashcard_ids']
+
+
+def test_ids_come_back_in_card_order(app_module, db):
+    user_id = db.add_user()
+    ids = save(app_module, user_id, CARDS)
+
+    assert db.execute("SELECT id, user_id, question, topic, question_type, difficulty FROM flashcards "
+                      "ORDER BY id") == [
+        (ids[0], user_id, 'What is osmosis?', 'biology', 'definition', 'easy'),
+        (ids[1], user_id, 'What is diffusion?', 'biology', 'short_answer', 'medium'),
+        (ids[2], user_id, 'What does active transport use?', 'biology', 'short_answer', 'hard'),
+    ]
+
+
+def test_basic_schema_without_type_and_difficulty(app_module, db, monkeypatch):
+    monkeypatch.setattr(app_module.eduverse, '_flashcard_columns',
+                        app_module.eduverse._flashcard_columns - {'question_type', 'difficulty'})
+    user_id = db.add_user()
+    [card_id] = save(app_module, user_id, CARDS[:1])
+    assert db.execute("SELECT question_type, difficulty FROM flashcards WHERE id = ?",
+                      (card_id,)) == [('short_answer', 'medium')]
+
+
+def test_mysql_single_card(app_module, mysql_db):
+    user_id = mysql_db.add_user()
+    [card_id] = save(app_module, user_id, CARDS[:1])
+    assert mysql_db.execute("SELECT question FROM flashcards WHERE id = ?", (card_id,)) == [('What is osmosis?',)]
+
+
+@pytest.mark.parametrize('dedupe', [True, False])
+def test_mysql_batch_returns_each_cards_own_id(app_module, mysql_db, monkeypatch, dedupe):
+    if not dedupe:
+        monkeypatch.setattr(app_module.eduverse, '_flashcard_columns',
+                            app_module.eduverse._flashcard_columns - {'question_signature'})
+    user_id = mysql_db.add_user()
+    # Another writer's row lands after each of ours, so the new ids are not consecutive
+    mysql_db.execute("CREATE TRIGGER interleave AFTER INSERT ON flashcards WHEN NEW.topic != 'other' BEGIN "
+                     "INSERT INTO flashcards (user_id, question, answer, topic) "
+                     "VALUES (NEW.user_id, 'concurrent', 'x', 'other'); END")
+
+    with query_profiler.max_queries(4 if dedupe else 2) as profile:
+        ids = save(app_module, user_id, CARDS)
+    # One multi-row INSERT and one SELECT of the ids, not a statement per card
+    assert sum(1 for query in profile.queries if 'INSERT INTO flashcards' in query.statement) == 1
+
+    assert [mysql_db.execute("SELECT question FROM flashcards WHERE id = ?", (card_id,))[0][0]
+            for card_id in ids] == [card['question'] for card in CARDS]
+    if dedupe:
+        assert {row[0] for row in mysql_db.execute("SELECT DISTINCT flashcard_id FROM flashcard_lsh")} == set(ids)
+
+
+def test_empty_batch_saves_nothing(app_module, db):
+    assert app_module.eduverse.save_flashcards(db.add_user(), [], 'biology') == {
+        'flashcard_ids': [], 'saved': 0, 'skipped': 0}
@@ -0,0 +1,81 @@
+import time
+
+
+class FlakyMigrator:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+        self.latest_version = 3
+
+    def pending_versions(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError('database is starting up')
+        return []
+
+    def migrate(self):
+        raise AssertionError('workers must not apply migrations')
+
+
+def test_failed_schema_check_is_retried_with_backoff(app_module, monkeypatch):
+    eduverse = app_module.eduverse
+    migrator = FlakyMigrator(failures=2)
+    monkeypatch.setattr(eduverse, 'migrator', migrator)
+    monkeypatch.setattr(eduverse, '_db_available', None)
+    monkeypatch.setattr(eduverse, '_schema_failures', 0)
+    monkeypatch.setattr(eduverse, '_schema_retry_at', None)
+    monkeypatch.setattr(app_module, 'SCHEMA_RETRY_SECONDS', 5)
+
+    assert eduverse.db_available is False
+    assert eduverse._schema_retry_at - time.monotonic() > 4
+    # Within the backoff the failure is remembered instead of hitting the database again
+    assert eduverse.db_available is False
+    assert migrator.calls == 1
+
+    eduverse._schema_retry_at = time.monotonic() - 1
+    assert eduverse.db_available is False
+    assert migrator.calls == 2
+    assert eduverse._schema_retry_at - time.monotonic() > 9  # the wait doubled
+
+    eduverse._schema_retry_at = time.monotonic() - 1
+    assert eduverse.db_available is True
+    assert migrator.calls == 3
+    assert eduverse._schema_retry_at is None and eduverse._schema_failures == 0
+    assert eduverse.db_available is True
+    assert migrator.calls == 3
+
+
+def test_backoff_is_capped(app_module, monkeypatch):
+    eduverse = app_module.eduverse
+    monkeypatch.setattr(eduverse, 'migrator', FlakyMigrator(failures=100))
+    monkeypatch.setattr(eduverse, '_db_available', None)
+    monkeypatch.setattr(eduverse, '_schema_failures', 20)
+    monkeypatch.setattr(eduverse, '_schema_retry_at', None)
+    monkeypatch.setattr(app_module, 'SCHEMA_RETRY_MAX_SECONDS', 60)
+
+    assert eduverse.ensure_schema() is False
+    assert eduverse._schema_retry_at - time.monotonic() <= 60
+
+
+class BehindMigrator(FlakyMigrator):
+    def pending_versions(self):
+        self.calls += 1
+        return [3]
+
+
+def test_pending_migrations_make_routes_answer_503(app_module, client, monkeypatch):
+    eduverse = app_module.eduverse
+    migrator = BehindMigrator(failures=0)
+    monkeypatch.setattr(eduverse, 'migrator', migrator)
+    monkeypatch.setattr(eduverse, '_db_available', None)
+    monkeypatch.setattr(eduverse, '_schema_failures', 0)
+    monkeypatch.setattr(eduverse, '_schema_retry_at', None)
+    monkeypatch.setattr(eduverse, 'schema_pending', [])
+
+    response = client.get('/login')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    assert eduverse.schema_pending == [3]
+    # /health never touches the database
+    assert client.get('/health').status_code == 200
+    assert migrator.calls == 1
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from srs import DEFAULT_EASE, GRADE_CORRECT, GRADE_INCORRECT, MIN_EASE, RELEARN_DELAY, schedule_review
+
+NOW = datetime(2024, 1, 1, 9, 0)
+
+
+def review(state, grade):
+    return schedule_review(state['ease_factor'], state['interval_days'], state['repetitions'], grade, NOW)
+
+
+def test_new_card_follows_one_six_then_ease_intervals():
+    state = schedule_review(None, None, None, GRADE_CORRECT, NOW)
+    assert (state['interval_days'], state['repetitions']) == (1, 1)
+    assert state['due_at'] == NOW + timedelta(days=1)
+
+    state = review(state, GRADE_CORRECT)
+    assert (state['interval_days'], state['repetitions']) == (6, 2)
+
+    state = review(state, GRADE_CORRECT)
+    assert state['repetitions'] == 3
+    assert state['interval_days'] == round(6 * state['ease_factor'])
+    assert state['due_at'] == NOW + timedelta(days=state['interval_days'])
+
+
+def test_grade_four_keeps_the_ease():
+    assert schedule_review(DEFAULT_EASE, 0, 0, 4, NOW)['ease_factor'] == DEFAULT_EASE
+    assert schedule_review(DEFAULT_EASE, 0, 0, 5, NOW)['ease_factor'] == DEFAULT_EASE + 0.1
+
+
+def test_lapse_resets_and_relearns_soon():
+    state = schedule_review(2.5, 15, 4, GRADE_INCORRECT, NOW)
+    assert (state['interval_days'], state['repetitions']) == (0, 0)
+    assert state['due_at'] == NOW + RELEARN_DELAY
+    assert state['ease_factor'] < 2.5
+
+
+def test_ease_never_drops_below_minimum():
+    state = {'ease_factor': None, 'interval_days': None, 'repetitions': None}
+    for _ in range(20):
+        state = review(state, 0)
+    assert state['ease_factor'] == MIN_EASE
+
+
+def test_grade_is_clamped():
+    assert schedule_review(2.5, 6, 2, 9, NOW) == schedule_review(2.5, 6, 2, 5, NOW)
+    assert schedule_review(2.5, 6, 2, -3, NOW) == schedule_review(2.5, 6, 2, 0, NOW)
@@ -0,0 +1,25 @@
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = 'learner'
+
+
+def submit(client, session_id, cards=4, correct=3):
+    return client.post('/submit_study_results', json={'session_id': session_id, 'cards_studied': cards,
+                                                      'correct_answers': correct, 'time_minutes': 2})
+
+
+def test_results_are_saved_only_to_the_users_own_session(app_module, client, db):
+    owner = db.add_user('owner')
+    other = db.add_user('other')
+    session_id = app_module.eduverse.start_study_session(owner, 'biology')
+
+    login(client, other)
+    assert submit(client, session_id).status_code == 404
+    assert db.execute("SELECT cards_studied FROM study_sessions WHERE id = ?", (session_id,)) == [(0,)]
+    assert db.execute("SELECT total_cards FROM user_stats_rollup WHERE user_id = ?", (other,)) == []
+
+    login(client, owner)
+    assert submit(client, session_id).status_code == 200
+    assert db.execute("SELECT cards_studied, correct_answers FROM study_sessions WHERE id = ?",
+                      (session_id,)) == [(4, 3)]
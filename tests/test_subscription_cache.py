@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+
+def test_upgrade_in_another_worker_is_seen_at_once(app_module, db):
+    eduverse = app_module.eduverse
+    user_id = db.add_user(trial_days=-1)
+    assert eduverse.is_subscription_active(user_id) is False
+
+    # Another worker upgrades the user; this process's cache was never told
+    db.execute("UPDATE subscriptions SET subscription_type = 'premium', status = 'active', "
+               "subscription_end_date = ? WHERE user_id = ?", (datetime.now() + timedelta(days=30), user_id))
+    assert eduverse.is_subscription_active(user_id) is True
+
+
+def test_lookup_error_is_not_cached(app_module, db, monkeypatch):
+    eduverse = app_module.eduverse
+    user_id = db.add_user()
+    lookup = eduverse.get_user_subscription
+    failures = [None]  # get_user_subscription reports a database error as None
+    monkeypatch.setattr(eduverse, 'get_user_subscription',
+                        lambda user_id: failures.pop() if failures else lookup(user_id))
+
+    assert eduverse.is_subscription_active(user_id) is False
+    assert eduverse.is_subscription_active(user_id) is True
+
+
+def test_active_result_is_cached_until_it_ends(app_module):
+    cache = app_module.SubscriptionStatusCache(ttl=60)
+    cache.set_active(1, ends_at=datetime.now() - timedelta(seconds=1))
+    cache.set_active(2)
+    assert cache.get(1) is None
+    assert cache.get(2) is True
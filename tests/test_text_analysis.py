@@ -0,0 +1,72 @@
+from text_analysis import analyze_notes
+
+
+def sentences_of(notes):
+    return [sentence for sentence, _ in analyze_notes(notes, max_sentences=20).sentences]
+
+
+def test_heading_lines_are_not_glued_to_sentences():
+    notes = ("Section 1:\nPhotosynthesis converts light energy into chemical energy.\n"
+             "# Cell Biology\nMitochondria produce ATP through oxidative phosphorylation\n"
+             "Chapter 3 - Genetics\nGenes are inherited from both parents.")
+    sentences = sentences_of(notes)
+    assert 'Photosynthesis converts light energy into chemical energy' in sentences
+    assert 'Mitochondria produce ATP through oxidative phosphorylation' in sentences
+    assert 'Genes are inherited from both parents' in sentences
+    assert not any('Section' in s or 'Cell Biology' in s or 'Chapter' in s for s in sentences)
+
+
+def test_heading_words_are_not_terms():
+    notes = "Section 1:\nOsmosis moves water across membranes. Osmosis needs a membrane."
+    assert 'section' not in [term.lower() for term in analyze_notes(notes).terms]
+
+
+def test_sentence_that_mentions_a_section_is_kept():
+    notes = "Section 2 covers mitosis and meiosis in dividing cells"
+    assert sentences_of(notes) == [notes]
+
+
+def test_wrapped_lines_join_into_one_sentence():
+    notes = "Enzymes lower the activation\nenergy of chemical reactions."
+    assert sentences_of(notes) == ['Enzymes lower the activation energy of chemical reactions']
+
+
+def test_repeated_sentence_is_a_candidate_once():
+    sentence = 'Photosynthesis converts light energy into chemical energy'
+    assert sentences_of(f'{sentence}. {sentence}. {sentence}.') == [sentence]
+
+
+def test_repeated_and_rare_terms_rank_first():
+    notes = ("Mitochondria generate ATP. Mitochondria have two membranes. "
+             "The cell uses ATP for work. Mitochondria divide on their own.")
+    terms = analyze_notes(notes, max_terms=3).terms
+    assert terms[:2] == ['ATP', 'mitochondria']  # ATP is also boosted as capitalized mid-sentence
+    assert not {'the', 'for', 'their'} & {term.lower() for term in terms}
+
+
+def test_proper_nouns_keep_their_capitals():
+    notes = "The theory was proposed by Darwin. Natural selection, as Darwin wrote, acts on variation."
+    assert 'Darwin' in analyze_notes(notes).terms
+
+
+def test_sentences_carry_their_best_term_as_written():
+    notes = "Photosynthesis happens in chloroplasts. Chloroplasts contain chlorophyll pigments."
+    for sentence, term in analyze_notes(notes).sentences:
+        assert term in sentence
+
+
+def test_limits_and_empty_notes():
+    notes = '. '.join(f'Topic number {i} covers enzyme kinetics in detail' for i in range(10)) + '.'
+    analysis = analyze_notes(notes, max_terms=2, max_sentences=3)
+    assert len(analysis.terms) == 2
+    assert len(analysis.sentences) == 3
+    assert analyze_notes('').terms == [] and analyze_notes('').sentences == []
+
+
+def test_line_ending_in_a_colon_is_a_heading_only_when_it_reads_like_one():
+    notes = ("Key Terms:\nIgneous rock forms from cooled magma.\n\n"
+             "The three types of rock are:\nigneous, sedimentary and metamorphic rock.")
+    sentences = sentences_of(notes)
+    assert 'Igneous rock forms from cooled magma' in sentences
+    assert 'The three types of rock are: igneous, sedimentary and metamorphic rock' in sentences
+    assert not any('Key Terms' in s for s in sentences)
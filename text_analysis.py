@@ -0,0 +1,159 @@
+"""
+Key-term and sentence ranking for the offline flashcard generator
+
+Notes are tokenized in a single pass with precompiled patterns. Terms are
+ranked TF-IDF style: term frequency in the notes weighted by an inverse
+document frequency estimated from the rank of the word in a bundled list
+of common English vocabulary, so everyday words sink and subject-specific
+terms rise. Candidate sentences are then scored by the terms they contain.
+"""
+import heapq
+import math
+import re
+
+# A sentence ends at . ! ? or at a blank line or heading; single line breaks are wrapping
+_SENTENCE_RE = re.compile(r'[^.!?\n]+(?:\n(?![ \t]*(?:\n|#))[^.!?\n]*)*')
+# Heading lines ("# Cells", "Key Terms:", "Section 2:", "Chapter 3 - Genetics") are dropped
+# before tokenizing, so they neither join the next sentence nor rank as terms. A line
+# ending in ':' counts only if it is at most six Title-Case or ALL-CAPS words (small
+# joining words allowed), so "The three types of rock are:" stays in the text.
+_HEADING_LINE_RE = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t][^\n]*"
+    r"|[A-Z0-9][\w'&/-]*(?:[ \t]+(?:[A-Z0-9][\w'&/-]*|a|an|and|at|by|for|in|of|on|or|the|to|vs)){0,5}[ \t]*:"
+    r"|(?i:chapter|section|unit|lecture|part)[ \t]+[\w.-]+(?:[ \t]*[-:][^\n.!?]{0,60})?)[ \t]*$",
+    re.MULTILINE)
+_WORD_RE = re.compile(r"[^\W\d_]+(?:['-][^\W\d_]+)*")
+
+MIN_TERM_LENGTH = 3
+MIN_SENTENCE_LENGTH = 15
+MAX_SENTENCE_LENGTH = 200
+PROPER_NOUN_BOOST = 1.5
+CUE_WORD_BONUS = 0.5
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before
+being below between both but by can can't cannot could couldn't did didn't do does doesn't doing
+don't down during each either etc even ever every few for from further get gets got had hadn't has
+hasn't have haven't having he her here hers herself him himself his how however i if in into is
+isn't it it's its itself just let may me might more most much must my myself neither no nor not now
+of off often on once one only or other others otherwise our ours ourselves out over own per rather
+same shall she should shouldn't since so some such than that that's the their theirs them themselves
+then there there's these they this those though through thus to too under until up upon us very
+was wasn't we were weren't what when where whether which while who whom whose why will with within
+without won't would wouldn't yet you your yours yourself yourselves
+""".split())
+
+# Words that signal a definitional or explanatory sentence
+CUE_WORDS = frozenset((
+    'is', 'are', 'means', 'refers', 'consists', 'includes', 'involves',
+    'process', 'system', 'method', 'theory', 'principle', 'defined', 'called',
+))
+
+# Common English vocabulary, most frequent first. A word's position stands in
+# for its document frequency in a general background corpus (Zipf's law), so
+# earlier words get a lower IDF; words not listed are treated as rarer than all.
+BACKGROUND_VOCABULARY = tuple("""
+time people year way day man thing woman life child world school state family student group country
+problem hand part place case week company system program question work government number night point
+home water room mother area money story fact month lot right study book eye job word business issue
+side kind head house service friend father power hour game line end member law car city community name
+president team minute idea kid body information back parent face level office door health person art
+war history party result change morning reason research girl guy moment air teacher force education
+foot boy age policy process music market sense nation plan college interest death experience effect
+use class control care field development role effort rate heart drug show leader light voice wife
+police mind price report decision son view relationship town road arm difference value building action
+model season society tax director position player record paper space ground form event official matter
+center couple site project activity star table need court oil situation cost industry figure street
+image phone data picture practice piece land product doctor wall patient worker news test movie north
+love support technology step baby computer type attention film tree source organization hair window
+evidence population site training skill example method theory principle concept structure function
+material energy term factor approach analysis period simple important different large small great
+little good new old high long first last next early young real best better sure free full special
+clear whole certain social public human local general national political economic major strong
+possible common hard available likely similar able main natural easy single current private past
+include provide make take give know think come look want find tell become leave feel bring begin keep
+hold write stand hear turn start show play move live believe happen produce allow lead understand
+create describe explain consider change develop define involve require refer contain represent form
+""".split())
+
+_BACKGROUND_RANKS = {}
+for _rank, _word in enumerate(BACKGROUND_VOCABULARY, 1):
+    _BACKGROUND_RANKS.setdefault(_word, _rank)
+del _rank, _word
+_UNSEEN_IDF = math.log(len(BACKGROUND_VOCABULARY) + 1) + 1.0
+
+
+def background_idf(term):
+    """IDF estimate for a lowercased term from its background vocabulary rank"""
+    rank = _BACKGROUND_RANKS.get(term)
+    if rank is None:
+        return _UNSEEN_IDF
+    return math.log(rank + 1)
+
+
+class NotesAnalysis:
+    """Ranked terms and sentences for one set of notes, shared by every question builder"""
+
+    def __init__(self, terms, sentences):
+        # terms: display forms, best first
+        # sentences: (sentence, best term as written in it) pairs, best first
+        self.terms = terms
+        self.sentences = sentences
+
+
+def analyze_notes(notes, max_terms=10, max_sentences=5):
+    """Tokenize notes once and return their top-ranked terms and sentences"""
+    counts = {}
+    capitalized = {}  # key -> surface form seen capitalized mid-sentence
+    candidates = []  # (sentence, token keys) for sentences of a usable length
+    seen_sentences = set()
+
+    word_finditer = _WORD_RE.finditer
+    for sentence_match in _SENTENCE_RE.finditer(_HEADING_LINE_RE.sub('', notes)):
+        sentence = ' '.join(sentence_match.group().split())
+        if not sentence:
+            continue
+        keys = []
+        first = True
+        for word_match in word_finditer(sentence):
+            word = word_match.group()
+            key = word.lower()
+            keys.append(key)
+            if len(key) >= MIN_TERM_LENGTH and key not in STOPWORDS:
+                counts[key] = counts.get(key, 0) + 1
+                if not first and word[0].isupper() and key not in capitalized:
+                    capitalized[key] = word
+            first = False
+        # A sentence repeated in the notes still counts towards term weights, but is a candidate once
+        if MIN_SENTENCE_LENGTH < len(sentence) < MAX_SENTENCE_LENGTH and sentence.lower() not in seen_sentences:
+            seen_sentences.add(sentence.lower())
+            candidates.append((sentence, keys))
+
+    weights = {}
+    for key, count in counts.items():
+        weight = (1.0 + math.log(count)) * background_idf(key)
+        if key in capitalized:
+            weight *= PROPER_NOUN_BOOST
+        weights[key] = weight
+
+    top_keys = heapq.nlargest(max_terms, weights, key=weights.__getitem__)
+    terms = [capitalized.get(key, key) for key in top_keys]
+
+    scored = []
+    for position, (sentence, keys) in enumerate(candidates):
+        distinct = dict.fromkeys(keys)  # ordered, so ties resolve the same way every run
+        term_keys = [key for key in distinct if key in weights]
+        if not term_keys:
+            continue
+        score = sum(weights[key] for key in term_keys) / math.sqrt(len(keys))
+        if not CUE_WORDS.isdisjoint(distinct):
+            score += CUE_WORD_BONUS * score
+        best = max(term_keys, key=weights.__getitem__)
+        # Earlier sentences win ties, so results are stable for the same notes
+        scored.append((score, -position, sentence, best))
+
+    sentences = []
+    for _, _, sentence, best in heapq.nlargest(max_sentences, scored):
+        match = re.search(r'\b%s\b' % re.escape(best), sentence, re.IGNORECASE)
+        sentences.append((sentence, match.group() if match else best))
+    return NotesAnalysis(terms, sentences)
@@ -0,0 +1,122 @@
+"""
+Write-behind buffer: collects records in memory and hands them to a flush
+function in batches, when the buffer fills up or a time interval passes
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Thread-safe in-memory buffer flushed in bulk by a background thread
+
+    flush_func receives a list of records and must raise on failure; failed
+    batches are put back and retried on the next flush. At most max_pending
+    records are held, and the oldest are dropped beyond that.
+    """
+
+    def __init__(self, flush_func, batch_size=200, flush_interval=5.0,
+                 max_pending=20000, name='write-behind'):
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.name = name
+
+        self.flushed = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+        self._pending = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+    def add(self, records):
+        """Queue records for the next bulk write"""
+        with self._cond:
+            for record in records:
+                if len(self._pending) >= self.max_pending:
+                    self._pending.popleft()
+                    self.dropped += 1
+                self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        self._ensure_thread()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of records written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft()
+                             for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return written
+                try:
+                    self.flush_func(batch)
+                except Exception as e:
+                    logger.error("%s: flush of %s records failed: %s", self.name, len(batch), e)
+                    self.failed_flushes += 1
+                    with self._cond:
+                        # Put the batch back in order, keeping within max_pending
+                        room = self.max_pending - len(self._pending)
+                        requeue = batch[-room:] if room > 0 else []
+                        self.dropped += len(batch) - len(requeue)
+                        self._pending.extendleft(reversed(requeue))
+                    return written
+                written += len(batch)
+                self.flushed += len(batch)
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'failed_flushes': self.failed_flushes,
+        }
+
+    def _ensure_thread(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            if stopping:
+                return
+            self.flush()
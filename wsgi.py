@@ -0,0 +1,7 @@
+"""
+WSGI entry point for EduVerse (used by gunicorn: ``gunicorn -c gunicorn.conf.py wsgi:app``)
+"""
+from app import app
+
+if __name__ == "__main__":
+    app.run()